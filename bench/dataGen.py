@@ -0,0 +1,53 @@
+import csv
+import datetime
+import os
+import random
+
+CATEGORIES = ['Mammal', 'Bird', 'Reptile', 'Amphibian', 'Fish', 'Insect', 'Arachnid', 'Crustacean', 'Mollusc', 'Worm']
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'to', 'zu', 'ne', 'bi', 'sa', 'do', 'fe', 'gu', 'ha', 'jo', 'pe', 'wi']
+
+
+def _name(rng, parts):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+#row counts per table for a given number of animals
+def table_sizes(animals):
+    enclosures = max(10, animals // 100)
+    return {
+        'enclosure': enclosures,
+        'animalcat': len(CATEGORIES),
+        'animalbreed': max(20, animals // 500),
+        'keeper': enclosures * 2,
+        'animal': animals,
+    }
+
+
+#same seed and size = same rows; ids are given explicitly and start at 1,
+#so the tables must be empty (see runBench.reset)
+def generate(directory, animals, seed=153):
+    rng = random.Random(seed)
+    sizes = table_sizes(animals)
+    files = {}
+
+    def write(table, header, rows):
+        path = os.path.join(directory, f"{table}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        files[table] = path
+
+    write('enclosure', ['name', 'size'],
+          ((f"{_name(rng, 2)} Enclosure {i}", rng.randint(50, 5000)) for i in range(1, sizes['enclosure'] + 1)))
+    write('animalcat', ['category'], ((category,) for category in CATEGORIES))
+    write('animalbreed', ['breed', 'animalcat_id'],
+          ((f"{_name(rng, 3)} {i}", rng.randint(1, sizes['animalcat'])) for i in range(1, sizes['animalbreed'] + 1)))
+    write('keeper', ['name', 'enclosure_id'],
+          ((_name(rng, 2) + ' ' + _name(rng, 3), rng.randint(1, sizes['enclosure'])) for _ in range(sizes['keeper'])))
+    start = datetime.date(2000, 1, 1)
+    write('animal', ['name', 'birthday', 'animalbreed_id', 'enclosure_id'],
+          ((_name(rng, rng.randint(2, 4)), start + datetime.timedelta(days=rng.randint(0, 9000)),
+            rng.randint(1, sizes['animalbreed']), rng.randint(1, sizes['enclosure']))
+           for _ in range(sizes['animal'])))
+    return files, sizes
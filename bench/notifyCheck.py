@@ -0,0 +1,83 @@
+import argparse
+import contextlib
+import io
+import sys
+import time
+from zoo.zooApp import zooApp
+from bench.runBench import ThrowawayPostgres
+
+
+def check(name, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return ok
+
+
+#until(condition) polls for up to timeout seconds, notifications are async
+def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def quiet(call, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return call(*args)
+
+
+def run(config):
+    # two clients, as two ZooInput terminals would be
+    first, second = zooApp(config, 'postgresql'), zooApp(config, 'postgresql')
+    for dao in (first, second):
+        dao.connect()
+        dao.create_tables()
+    results = []
+    try:
+        results.append(check("both listeners are connected",
+                             until(lambda: first.listener.connected and second.listener.connected)))
+        quiet(second.add_enclosure, "Savanna", 500)
+        quiet(second.add_keeper, "Anna", 1)
+        results.append(check("a row is cached", first.get_enclosure_by_id(1).name == "Savanna"
+                             and first.get_enclosure_by_id(1) is first.get_enclosure_by_id(1)))
+        first.get_keeper_by_id(1)
+
+        quiet(second.edit_enclosure, 1, "Big savanna", 800)
+        results.append(check("an edit in another client evicts the row",
+                             until(lambda: first.get_enclosure_by_id(1).name == "Big savanna")))
+
+        quiet(second.delete_enclosure, 1)
+        results.append(check("a delete evicts the row and what the FK cascade removed",
+                             until(lambda: first.get_enclosure_by_id(1) is None and first.get_keeper_by_id(1) is None)))
+
+        with second.cursor() as cur:
+            cur.execute("INSERT INTO enclosure (name, size) SELECT 'Pen ' || i, i FROM generate_series(1, 1000) i")
+            second.commit(cur)
+        first.get_enclosure_by_id(2)
+        with second.cursor() as cur:
+            cur.execute("UPDATE enclosure SET size = size + 1")
+            second.commit(cur)
+        results.append(check("a statement over more rows than fit a notification clears the table",
+                             until(lambda: first.get_enclosure_by_id(2).size == 2)))
+        print(f"     {first.cache_stats()['listener']}")
+    finally:
+        first.close()
+        second.close()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check cache invalidation between two clients via LISTEN/NOTIFY')
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl for the throwaway server')
+    args = parser.parse_args()
+
+    with ThrowawayPostgres(args.pg_bin) as config:
+        with open(config, 'a') as f:
+            f.write("[cache]\nttl_enclosure=3600\nttl_keeper=3600\n")
+        passed = run(config)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import contextlib
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+from zoo.zooApp import zooApp
+from zoo.zooCache import ZooCache
+from bench.runBench import ThrowawayPostgres
+
+
+class ThrowawayStandby:
+
+    #streaming replica of a ThrowawayPostgres, via pg_basebackup -R
+    def __init__(self, primary):
+        self.primary = primary
+        self.data = os.path.join(primary.directory, 'standby')
+        self.port = None
+
+    def __enter__(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        subprocess.run([self.primary._tool('pg_basebackup'), '-D', self.data, '-R', '-X', 'stream',
+                        '-h', self.primary.directory, '-p', str(self.primary.port), '-U', 'postgres'],
+                       check=True, stdout=subprocess.DEVNULL)
+        self.start()
+        return self
+
+    def start(self):
+        subprocess.run([self.primary._tool('pg_ctl'), '-D', self.data, '-w',
+                        '-l', os.path.join(self.primary.directory, 'standby.log'),
+                        '-o', f"-p {self.port} -k {self.primary.directory} -c listen_addresses=''", 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        subprocess.run([self.primary._tool('pg_ctl'), '-D', self.data, '-m', 'immediate', 'stop'],
+                       stdout=subprocess.DEVNULL)
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def check(name, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return ok
+
+
+def reads(dao):
+    return dao.replica_stats()[0]['reads']
+
+
+def run(config, standby):
+    dao = zooApp(config, 'postgresql')
+    dao.connect()
+    dao.create_tables()
+    results = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            dao.add_enclosure("Replica check", 100)
+        before = reads(dao)
+        dao.view_all_enclosures()
+        results.append(check("a read right after a write goes to the primary", reads(dao) == before))
+
+        time.sleep(dao.sticky)
+        # wait for the standby to replay the insert
+        for _ in range(50):
+            enclosures = dao.view_all_enclosures()
+            if any(row.name == "Replica check" for row in enclosures):
+                break
+            time.sleep(0.1)
+        results.append(check("reads go to the replica once sticky has passed", reads(dao) > before))
+        results.append(check("the replica sees the write", any(row.name == "Replica check" for row in enclosures)))
+        prepared = [dao.prepared_statements(conn) for conn in list(dao._prepared.keys()) if conn.info.port == standby.port]
+        results.append(check("replica connections prepare only the reads",
+                             prepared and all(names and names <= set(dao.statements.reads) for names in prepared)))
+
+        dao.cache = ZooCache()
+        before = reads(dao)
+        enclosure = dao.get_enclosure_by_id(1)
+        results.append(check("a cache miss is read from the primary",
+                             enclosure is not None and reads(dao) == before and dao.get_enclosure_by_id(1) == enclosure))
+        dao.cache = None
+
+        # nothing written for longer than max_lag, the caught up replica
+        # does not count as lagging
+        time.sleep(dao.replicas.max_lag + dao.replicas.check_interval + 0.5)
+        before = reads(dao)
+        dao.view_all_enclosures()
+        results.append(check("an idle primary does not make the replica lag",
+                             reads(dao) > before and dao.replica_stats()[0]['lag'] == 0))
+
+        # every replica connection checked out: reads go to the primary, the
+        # replica is not marked down for it
+        pool = dao.replicas.replicas[0].pool
+        pool.timeout = 0.1
+        held = [pool.getconn() for _ in range(pool.maxconn)]
+        failures = dao.replica_stats()[0]['failures']
+        enclosures = dao.view_all_enclosures()
+        for conn in held:
+            pool.putconn(conn)
+        stats = dao.replica_stats()[0]
+        results.append(check("an exhausted replica pool is not a failed replica",
+                             stats['healthy'] and stats['failures'] == failures and len(enclosures) > 0))
+
+        standby.stop()
+        with contextlib.redirect_stdout(io.StringIO()):
+            dao.view_all_enclosures()
+        enclosures = dao.view_all_enclosures()
+        stats = dao.replica_stats()[0]
+        results.append(check("a failed replica is marked down", not stats['healthy'] and stats['failures'] > 0))
+        results.append(check("reads fall back to the primary", any(row.name == "Replica check" for row in enclosures)))
+
+        standby.start()
+        # until its WAL receiver streams again a restarted standby counts as
+        # lagging (no receive LSN to compare), so allow a few checks
+        for _ in range(10):
+            time.sleep(dao.replicas.check_interval)
+            before = reads(dao)
+            dao.view_all_enclosures()
+            if reads(dao) > before:
+                break
+        results.append(check("the replica is used again after a health check",
+                             reads(dao) > before and dao.replica_stats()[0]['healthy']))
+    finally:
+        dao.close()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check replica routing against a throwaway primary and standby')
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl/pg_basebackup')
+    args = parser.parse_args()
+
+    primary = ThrowawayPostgres(args.pg_bin)
+    with primary as config:
+        with ThrowawayStandby(primary) as standby:
+            with open(config, 'a') as f:
+                f.write(f"[replica.standby]\nport={standby.port}\n[routing]\nsticky=1\ncheck_interval=1\nmax_lag=2\n")
+            passed = run(config, standby)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
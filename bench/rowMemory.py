@@ -0,0 +1,93 @@
+import argparse
+import contextlib
+import io
+import tracemalloc
+from zoo.zooApp import zooApp
+from bench.runBench import ThrowawayPostgres, load
+
+COLUMNS = ['animal_id', 'name']
+
+
+def cells(row):
+    return tuple(str(value) for value in row)
+
+
+# how view_all_animals read the table before typed rows: psycopg2's
+# tuples as they come from fetchall
+def tuples(dao):
+    with dao.read_cursor() as cur:
+        cur.execute(dao.statements.sql("view_all_animals"))
+        return cur.fetchall()
+
+
+# ... and the table screen holding a str copy of every cell next to them
+def tuples_and_strings(dao):
+    rows = tuples(dao)
+    return rows, [cells(row) for row in rows]
+
+
+def rows(dao):
+    return dao.view_all_animals()
+
+
+def rows_two_columns(dao):
+    return dao.view_all_animals(columns=COLUMNS)
+
+
+def streamed_two_columns(dao):
+    count = 0
+    for row in dao.stream_all_animals(columns=COLUMNS):
+        cells(row)
+        count += 1
+    return count
+
+
+CASES = [
+    ('tuples (before typed rows)', tuples),
+    ('tuples + str cells (before typed rows)', tuples_and_strings),
+    ('Animal rows', rows),
+    ('Animal rows, 2 columns', rows_two_columns),
+    ('streamed, 2 columns', streamed_two_columns),
+]
+
+
+#peak python heap while reading and holding the result; libpq's own
+#result buffer is C memory and not part of it
+def peak_kb(dao, read):
+    tracemalloc.start()
+    try:
+        result = read(dao)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak / 1024
+
+
+def run(config, section, animals, seed):
+    dao = zooApp(config, section)
+    dao.connect()
+    dao.create_tables()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            load(dao, animals, seed)
+        print(f"{animals} animals")
+        for name, read in CASES:
+            print(f"{peak_kb(dao, read):10.0f} KB  {name}")
+    finally:
+        dao.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak heap of reading the animal table, tuples vs typed rows')
+    parser.add_argument('--animals', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=153)
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl for the throwaway server')
+    args = parser.parse_args()
+
+    with ThrowawayPostgres(args.pg_bin) as config:
+        run(config, 'postgresql', args.animals, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from zoo.zooApp import zooApp
+from zoo.zooBulk import ZooBulkLoader
+from zoo.zooStats import ZooStats
+from bench.dataGen import generate, table_sizes
+
+
+class ThrowawayPostgres:
+
+    #initdb + pg_ctl in a temp dir, removed again on exit
+    def __init__(self, pg_bin=None):
+        self.pg_bin = pg_bin
+        self.directory = None
+        self.port = None
+
+    def _tool(self, name):
+        path = os.path.join(self.pg_bin, name) if self.pg_bin else shutil.which(name)
+        if not path:
+            raise RuntimeError(f"{name} not found, pass --pg-bin or use --config")
+        return path
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix='zoo_bench_')
+        # DAO errors of a throwaway run stay out of zoo/error.log
+        logging.basicConfig(filename=os.path.join(self.directory, 'error.log'), level=logging.ERROR,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+        data = os.path.join(self.directory, 'data')
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        subprocess.run([self._tool('initdb'), '-D', data, '-U', 'postgres', '-A', 'trust'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([self._tool('pg_ctl'), '-D', data, '-w', '-l', os.path.join(self.directory, 'log'),
+                        '-o', f"-p {self.port} -k {self.directory} -c listen_addresses='' -c fsync=off", 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        config = os.path.join(self.directory, 'database.ini')
+        with open(config, 'w') as f:
+            f.write(f"[postgresql]\nhost={self.directory}\nport={self.port}\nuser=postgres\ndatabase=postgres\n")
+        return config
+
+    def __exit__(self, *exc):
+        subprocess.run([self._tool('pg_ctl'), '-D', os.path.join(self.directory, 'data'), '-m', 'immediate', 'stop'],
+                       stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def reset(dao):
+    with dao.cursor() as cur:
+        cur.execute("TRUNCATE animal, keeper, animalbreed, animalcat, enclosure RESTART IDENTITY CASCADE")
+        dao.commit(cur)
+
+
+def load(dao, animals, seed):
+    reset(dao)
+    with tempfile.TemporaryDirectory(prefix='zoo_bench_data_') as directory:
+        files, sizes = generate(directory, animals, seed)
+        ZooBulkLoader(dao).load_many(files)
+    with dao.cursor() as cur:
+        cur.execute("ANALYZE")
+        dao.commit(cur)
+    dao.refresh_overview(force=True)
+    return sizes
+
+
+def _drain(rows):
+    for _ in rows:
+        pass
+
+
+# (method, call) in run order: reads, then writes, deletes last since they
+# remove rows; i is the repetition, so writes hit a different row each time
+CASES = [
+    ('view_all_enclosures', lambda dao, n, i: dao.view_all_enclosures()),
+    ('view_all_animalcats', lambda dao, n, i: dao.view_all_animalcats()),
+    ('view_all_animalbreed', lambda dao, n, i: dao.view_all_animalbreed()),
+    ('view_all_keepers', lambda dao, n, i: dao.view_all_keepers()),
+    ('view_all_animals', lambda dao, n, i: dao.view_all_animals()),
+    ('stream_all_animals', lambda dao, n, i: _drain(dao.stream_all_animals())),
+    ('view_animal_overview', lambda dao, n, i: dao.view_animal_overview()),
+    ('page_animals_first', lambda dao, n, i: dao.page_animals()),
+    ('page_animals_last', lambda dao, n, i: dao.page_animals(f"after:{n['animal'] - 20}")),
+    ('page_animal_overview_last', lambda dao, n, i: dao.page_animal_overview(f"after:{n['animal'] - 20}")),
+    ('stats_enclosures', lambda dao, n, i: ZooStats(dao).enclosures()),
+    ('stats_categories', lambda dao, n, i: ZooStats(dao).categories()),
+    ('get_enclosure_by_id', lambda dao, n, i: dao.get_enclosure_by_id(1 + i)),
+    ('get_animalcat_by_id', lambda dao, n, i: dao.get_animalcat_by_id(1 + i % n['animalcat'])),
+    ('get_animalbreed_by_id', lambda dao, n, i: dao.get_animalbreed_by_id(1 + i)),
+    ('get_keeper_by_id', lambda dao, n, i: dao.get_keeper_by_id(1 + i)),
+    ('get_animal_by_id', lambda dao, n, i: dao.get_animal_by_id(1 + i)),
+    ('view_keepers_by_enclosure', lambda dao, n, i: dao.view_keepers_by_enclosure(1 + i)),
+    ('search_animal_name', lambda dao, n, i: dao.search_animal_name('kalo')),
+    ('search_animal_name_limit_20', lambda dao, n, i: dao.search_animal_name('kalo', limit=20)),
+    ('search_all_limit_20', lambda dao, n, i: dao.search('kalo', limit=20)),
+    ('filter_breeds_by_category', lambda dao, n, i: dao.filter_breeds_by_category('Mammal')),
+    ('filter_breeds_by_categories', lambda dao, n, i: dao.filter_breeds_by_categories(['Mammal', 'Bird', 'Fish'])),
+    ('add_enclosure', lambda dao, n, i: dao.add_enclosure(f"Bench {i}", 100)),
+    ('add_animalcat', lambda dao, n, i: dao.add_animalcat(f"Bench {i}")),
+    ('add_animalbreed', lambda dao, n, i: dao.add_animalbreed(f"Bench {i}", 1)),
+    ('add_keeper', lambda dao, n, i: dao.add_keeper(f"Bench {i}", 1)),
+    ('add_animal', lambda dao, n, i: dao.add_animal(f"Bench {i}", '2020-01-01', 1, 1)),
+    ('edit_enclosure', lambda dao, n, i: dao.edit_enclosure(1 + i, f"Edited {i}", 200)),
+    ('edit_animalcat', lambda dao, n, i: dao.edit_animalcat(1 + i % n['animalcat'], f"Edited {i}")),
+    ('edit_animalbreed', lambda dao, n, i: dao.edit_animalbreed(1 + i, f"Edited {i}", 1)),
+    ('edit_keeper', lambda dao, n, i: dao.edit_keeper(1 + i, f"Edited {i}", 1)),
+    ('edit_animal', lambda dao, n, i: dao.edit_animal(1 + i, f"Edited {i}", '2020-01-01', 1, 1)),
+    ('delete_animal', lambda dao, n, i: dao.delete_animal(n['animal'] - i)),
+    ('delete_keeper', lambda dao, n, i: dao.delete_keeper(n['keeper'] - i)),
+    ('delete_animalbreed', lambda dao, n, i: dao.delete_animalbreed(n['animalbreed'] - i)),
+    ('delete_enclosure', lambda dao, n, i: dao.delete_enclosure(n['enclosure'] - i)),
+    ('delete_animalcat', lambda dao, n, i: dao.delete_animalcat(n['animalcat'] - i)),
+]
+
+
+def run(configfile, section, sizes, repeat, seed, only=None):
+    dao = zooApp(configfile, section)
+    dao.connect()
+    dao.create_tables()
+    report = {'sizes': sizes, 'repeat': repeat, 'seed': seed, 'tables': {}, 'results': {}}
+    try:
+        for animals in sizes:
+            started = time.perf_counter()
+            n = load(dao, animals, seed)
+            report['tables'][animals] = dict(n, load_seconds=time.perf_counter() - started)
+            for name, call in CASES:
+                if only and name not in only:
+                    continue
+                timings = []
+                for i in range(repeat):
+                    # the DAO prints a line per call, keep the report readable
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        start = time.perf_counter()
+                        call(dao, n, i)
+                        timings.append((time.perf_counter() - start) * 1000)
+                report['results'].setdefault(name, {})[animals] = {
+                    'median_ms': statistics.median(timings),
+                    'min_ms': min(timings),
+                    'max_ms': max(timings),
+                }
+    finally:
+        dao.close()
+    return report
+
+
+def markdown(report):
+    sizes = report['sizes']
+    lines = [f"# zooApp benchmark (median ms of {report['repeat']} runs, seed {report['seed']})", '']
+    lines.append('| method | ' + ' | '.join(f"{size} animals" for size in sizes) + ' |')
+    lines.append('|---|' + '---:|' * len(sizes))
+    for name, by_size in report['results'].items():
+        cells = [f"{by_size[size]['median_ms']:.2f}" if size in by_size else '' for size in sizes]
+        lines.append(f"| {name} | " + ' | '.join(cells) + ' |')
+    lines.append('')
+    lines.append('| animals | ' + ' | '.join(table_sizes(0)) + ' | load s |')
+    lines.append('|---:|' + '---:|' * (len(table_sizes(0)) + 1))
+    for size, counts in report['tables'].items():
+        lines.append(f"| {size} | " + ' | '.join(str(counts[t]) for t in table_sizes(0))
+                     + f" | {counts['load_seconds']:.1f} |")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every zooApp method at several data sizes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='animal counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=153)
+    parser.add_argument('--only', nargs='+', metavar='METHOD', help='run only these cases')
+    parser.add_argument('--out', default='bench/report', help='writes OUT.json and OUT.md')
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl for the throwaway server')
+    parser.add_argument('--config', help='use this database.ini instead of a throwaway server (tables get truncated!)')
+    parser.add_argument('--section', default='postgresql')
+    parser.add_argument('--force', action='store_true', help='required with --config')
+    args = parser.parse_args()
+
+    if args.config:
+        if not args.force:
+            parser.error('--config truncates all zoo tables, add --force if that is what you want')
+        report = run(args.config, args.section, args.sizes, args.repeat, args.seed, args.only)
+    else:
+        with ThrowawayPostgres(args.pg_bin) as config:
+            report = run(config, 'postgresql', args.sizes, args.repeat, args.seed, args.only)
+
+    with open(args.out + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(args.out + '.md', 'w') as f:
+        f.write(markdown(report))
+    print(markdown(report))
+
+
+if __name__ == '__main__':
+    main()
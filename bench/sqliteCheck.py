@@ -0,0 +1,167 @@
+import argparse
+import contextlib
+import datetime
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from zoo.zooSqlite import SqliteZooApp
+from zoo.zooStats import ZooStats
+from zoo.zooExport import ZooExporter
+from zoo.zooCache import ZooCache, MISSING
+
+
+def check(name, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return ok
+
+
+def quiet(call, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return call(*args)
+
+
+def run(dao, directory):
+    results = []
+    quiet(dao.add_enclosure, "Savanna", 500)
+    quiet(dao.add_enclosure, "Pond", 50)
+    quiet(dao.add_animalcat, "Mammal")
+    quiet(dao.add_animalcat, "Bird")
+    quiet(dao.add_animalbreed, "Lion", 1)
+    quiet(dao.add_animalbreed, "Flamingo", 2)
+    quiet(dao.add_keeper, "Anna", 1)
+    quiet(dao.add_keeper, "Ben", 1)
+    quiet(dao.add_animal, "Kalo", datetime.date(2019, 5, 1), 1, 1)
+    quiet(dao.add_animal, "Pinky", "2021-07-14", 2, 2)
+    quiet(dao.add_animal, "Kalonji", "2020-02-29", 1, 1)
+
+    results.append(check("rows come back typed, dates as dates",
+                         dao.get_animal_by_id(1).birthday == datetime.date(2019, 5, 1)))
+    results.append(check("a missing row is None", dao.get_animal_by_id(99) is None))
+    results.append(check("view_all with a column subset",
+                         [row.name for row in dao.view_all_animals(columns=['name'])] == ["Kalo", "Pinky", "Kalonji"]))
+    results.append(check("streaming returns every row", len(list(dao.stream_all_animals(batch_size=2))) == 3))
+    page = dao.page_animals(limit=2)
+    results.append(check("keyset pages", len(page.rows) == 2 and len(dao.page_animals(page.next, 2).rows) == 1))
+    past = dao.page_animals("after:99")
+    results.append(check("a page past the end leads back",
+                         past.rows == [] and len(dao.page_animals(past.previous, 2).rows) == 2
+                         and page.previous is None))
+    results.append(check("a bad page token is an empty page", quiet(dao.page_animals, "after:x") == ([], None, None)))
+    results.append(check("search is a case insensitive substring match",
+                         [row.name for row in dao.search_animal_name("KALO")] == ["Kalo", "Kalonji"]))
+    results.append(check("search escapes LIKE wildcards", dao.search_animal_name("%") == []))
+    results.append(check("filter by several categories",
+                         [row.breed for row in dao.filter_breeds_by_categories(["Mammal", "Bird"])] == ["Flamingo", "Lion"]))
+    overview = dao.view_animal_overview()
+    results.append(check("the overview is current without a refresh",
+                         overview[0].keepers == "Anna, Ben" and overview[1].category == "Bird"))
+    quiet(dao.add_animal, "Broken", "2021-02-30", 1, 1)
+    results.append(check("an invalid birthday is rejected", len(dao.view_all_animals()) == 3))
+
+    stats = ZooStats(dao)
+    results.append(check("statistics follow the writes", stats.totals()['animals'] == 3 and not stats.check()))
+    quiet(dao.edit_animal, 3, "Kalonji", "2020-02-29", 2, 2)
+    quiet(dao.delete_animalbreed, 1)
+    quiet(dao.delete_keeper, 2)
+    results.append(check("statistics survive moves and cascades", not stats.check()))
+    results.append(check("rebuild agrees with the triggers", stats.rebuild() and not stats.check()))
+
+    with dao.transaction():
+        with contextlib.suppress(Exception), dao.savepoint():
+            quiet(dao.add_enclosure, "Rolled back", 1)
+            raise RuntimeError
+        quiet(dao.add_enclosure, "Kept", 1)
+    results.append(check("savepoints roll back only their part",
+                         [row.name for row in dao.view_all_enclosures()] == ["Savanna", "Pond", "Kept"]))
+
+    dao.cache = ZooCache()
+    dao.get_enclosure_by_id(2)
+    with dao.transaction():
+        quiet(dao.edit_enclosure, 2, "Lake", 60)
+        kept = dao.cache.get('enclosure', 2) is not MISSING
+    results.append(check("cache evictions wait for the commit",
+                         kept and dao.get_enclosure_by_id(2).name == "Lake"))
+    dao.cache = None
+
+    path = os.path.join(directory, "animals.csv")
+    rows = ZooExporter(dao).export('animal', path)
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    results.append(check("csv export without COPY", rows == 2 and lines[0] == "animal_id,name,birthday,animalbreed_id,enclosure_id"))
+
+    results.append(check("moving every animal of an enclosure reports the count",
+                         quiet(dao.move_animals, 2, 1) == 2 and dao.get_animal_by_id(2).enclosure_id == 1))
+    results.append(check("reassigning keepers and retagging breeds",
+                         quiet(dao.reassign_keepers, 1, 3) == 1 and quiet(dao.retag_breeds, 2, 1) == 1
+                         and [row.enclosure_id for row in dao.view_keepers_by_enclosure(3)] == [3]))
+    results.append(check("a move onto a missing enclosure changes nothing",
+                         quiet(dao.move_animals, 1, 99) is None and len(dao.view_keepers_by_enclosure(3)) == 1
+                         and dao.get_animal_by_id(3).enclosure_id == 1))
+    dao.cache = ZooCache()
+    enclosure = dao.view_all_animals()[0].enclosure_id
+    moved = [row.animal_id for row in dao.view_all_animals() if row.enclosure_id == enclosure]
+    for key in moved:
+        dao.get_animal_by_id(key)
+    dao.bulk_evict = 0
+    cleared = quiet(dao.move_animals, enclosure, 3) == len(moved) and dao.cache.stats()['size'] == 0
+    for key in moved:
+        dao.get_animal_by_id(key)
+    dao.bulk_evict = 1000
+    evicted = quiet(dao.move_animals, 3, enclosure) == len(moved) and dao.cache.stats()['size'] == 0
+    results.append(check("set based changes evict row by row, or clear a big set", cleared and evicted))
+    dao.cache = None
+    results.append(check("deleting the animals of a breed",
+                         quiet(dao.delete_animals_by_breed, 2) == 2 and dao.get_animal_by_id(2) is None))
+    results.append(check("statistics follow the set based changes", not stats.check()))
+
+    hits = dao.search("sav")
+    results.append(check("search finds any kind of name by its start",
+                         [(hit.kind, hit.label) for hit in hits] == [('enclosure', "Savanna")]))
+    quiet(dao.add_keeper, "Savanna Smith", 1)
+    quiet(dao.edit_animalcat, 1, "Big cats")
+    results.append(check("search ranks the shorter name first and follows edits",
+                         [hit.label for hit in dao.search("savanna")] == ["Savanna", "Savanna Smith"]
+                         and [hit.kind for hit in dao.search("big CATS")] == ['animalcat']
+                         and dao.search("mammal") == []))
+    results.append(check("search by kind and page",
+                         [hit.kind for hit in dao.search("sav", kinds=['keeper'])] == ['keeper']
+                         and len(dao.search("sav", limit=1, offset=1)) == 1
+                         and dao.search("sav*") == dao.search("sav") and dao.search("  ") == []))
+    quiet(dao.delete_enclosure, 1)
+    results.append(check("deletes and FK cascades leave the index", dao.search("savanna") == []))
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        dao.get_animal_by_id(2)
+    # seconds for 1000 lookups = ms per lookup
+    ms = time.perf_counter() - start
+    print(f"     get_animal_by_id: {ms:.3f} ms per lookup")
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the zooApp surface on a throwaway SQLite file')
+    parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix='zoo_sqlite_') as directory:
+        # before zooApp points the log at zoo/error.log
+        logging.basicConfig(filename=os.path.join(directory, 'error.log'), level=logging.ERROR,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+        config = os.path.join(directory, 'database.ini')
+        with open(config, 'w') as f:
+            f.write(f"[backend]\nengine=sqlite\n[sqlite]\npath={os.path.join(directory, 'zoo.db')}\n"
+                    "[metrics]\nenabled=false\n")
+        dao = SqliteZooApp(config, 'postgresql')
+        dao.connect()
+        dao.create_tables()
+        try:
+            passed = run(dao, directory)
+        finally:
+            dao.close()
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must stay out of `import main`, the menu loads them
+DEFERRED = ['rich']
+
+# what `python main.py` does up to the first menu: import main, open the
+# DAO (imports zooApp), start the background connect and draw the menu
+MENU = """import sys
+from main import ZooInput, SECTION
+ZooInput(sys.argv[1], SECTION).display_menu()
+sys.stdout.flush()
+"""
+MARKER = "Enter your choice:"
+
+
+#one fresh interpreter importing main with -X importtime, returns
+#{module: cumulative us} of everything imported and main's direct imports
+def import_times(module='main'):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times, direct = {}, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        times[name] = int(cumulative)
+        # children are listed before their parent
+        if depth == 1:
+            direct.append(name)
+        elif depth == 0 and name != module:
+            direct = []
+    return times, direct
+
+
+#ms from starting a fresh interpreter until the menu's last line is on
+#stdout; without config only the bare interpreter (`python -c pass`)
+def first_menu(config=None):
+    with tempfile.TemporaryDirectory(prefix='zoo_startup_') as cwd:
+        # zooApp logs to zoo/error.log relative to the working directory
+        os.mkdir(os.path.join(cwd, 'zoo'))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+        command = [sys.executable, '-c', 'pass'] if config is None else [sys.executable, '-c', MENU, config]
+        start = time.perf_counter()
+        child = subprocess.Popen(command, cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            if config is None:
+                child.wait()
+                return (time.perf_counter() - start) * 1000
+            for line in child.stdout:
+                if MARKER in line:
+                    return (time.perf_counter() - start) * 1000
+            raise RuntimeError(f"no menu from main.py (exit code {child.wait()})")
+        finally:
+            child.kill()
+            child.wait()
+            child.stdout.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of main.py up to the first menu, exits 1 over budget')
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='Python overhead over the bare interpreter')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--top', type=int, default=10, help='show the N slowest direct imports')
+    parser.add_argument('--config', default=os.path.join(ROOT, 'zoo', 'database.ini'),
+                        help='database.ini for the DAO (the menu does not wait for the connection)')
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.repeat)]
+    import_ms = statistics.median(times['main'] for times, _ in runs) / 1000
+    last, children = runs[-1]
+    direct = sorted(((last[name], name) for name in children), reverse=True)
+    for cumulative, name in direct[:args.top]:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in DEFERRED if name in last]
+    if eager:
+        print(f"FAIL: imported by main: {', '.join(eager)}")
+        failed = True
+
+    bare_ms = statistics.median(first_menu() for _ in range(args.repeat))
+    menu_ms = statistics.median(first_menu(args.config) for _ in range(args.repeat))
+    overhead_ms = menu_ms - bare_ms
+    print(f"import main {import_ms:.1f} ms, first menu {menu_ms:.1f} ms, bare interpreter {bare_ms:.1f} ms "
+          f"(medians of {args.repeat})")
+    verdict = 'ok' if overhead_ms <= args.budget_ms else 'FAIL'
+    print(f"{verdict}: {overhead_ms:.1f} ms of Python startup up to the first menu, budget {args.budget_ms:.0f} ms")
+    sys.exit(1 if failed or verdict == 'FAIL' else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,206 @@
+import argparse
 import logging
+import sys
 import psycopg2
 from zoo.zooInput import ZooInput
+from zoo.zooBackends import open_dao
+from zoo.zooBulk import ZooBulkLoader, TABLE_ORDER
+from zoo.zooMigrations import ZooMigrator
+from zoo.zooExport import ZooExporter, EXPORTS, FORMATS, COMPRESSIONS
+from zoo.zooBatch import ZooBatch, BatchError, FIELDS, read_commands, dumps
+from zoo import zooStatements
+
+CONFIGFILE, SECTION = 'zoo/database.ini', 'postgresql'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Zoo database')
+    parser.add_argument('--bench-prepared', type=int, metavar='N',
+                        help='time N prepared vs ad-hoc runs of each get_*_by_id lookup and exit')
+    commands = parser.add_subparsers(dest='command')
+
+    bulk = commands.add_parser('import', help='bulk load CSV/JSONL files with COPY')
+    for table in TABLE_ORDER:
+        bulk.add_argument(f'--{table}', metavar='FILE', help=f'.csv or .jsonl file for {table}')
+
+    migrate = commands.add_parser('migrate', help='apply pending schema migrations')
+    migrate.add_argument('--status', action='store_true', help='only show schema version and indexes')
+
+    export = commands.add_parser('export', help='stream a table or the animal overview to csv/jsonl/parquet')
+    export.add_argument('table', choices=list(EXPORTS))
+    export.add_argument('-o', '--output', default='-', help='file, format and compression follow the name '
+                        '(animal.jsonl.gz); - = stdout (default)')
+    export.add_argument('--format', choices=FORMATS)
+    export.add_argument('--compress', choices=('none',) + COMPRESSIONS)
+    export.add_argument('--batch-size', type=int, help='rows per fetch / parquet row group')
+    export.add_argument('--columns', help='comma separated columns to export, default all')
+
+    # batch commands: one connection, one transaction, JSON lines on stdout
+    add = commands.add_parser('add', help='add a row: add TABLE field=value ...')
+    add.add_argument('table', choices=list(FIELDS))
+    add.add_argument('fields', nargs='+', metavar='field=value')
+    edit = commands.add_parser('edit', help='edit a row: edit TABLE ID field=value ...')
+    edit.add_argument('table', choices=list(FIELDS))
+    edit.add_argument('id', type=int)
+    edit.add_argument('fields', nargs='+', metavar='field=value')
+    delete = commands.add_parser('delete', help='delete rows: delete TABLE ID ...')
+    delete.add_argument('table', choices=list(FIELDS))
+    delete.add_argument('ids', type=int, nargs='+')
+    listing = commands.add_parser('list', help='all rows of a table')
+    listing.add_argument('table', choices=list(FIELDS))
+    search = commands.add_parser('search', help='search animals by name')
+    search.add_argument('name')
+    search.add_argument('--limit', type=int)
+    execfile = commands.add_parser('exec-file', help='run a JSONL command file (- = stdin)')
+    execfile.add_argument('file')
+    for batch in (add, edit, delete, listing, search, execfile):
+        batch.add_argument('--keep-going', action='store_true',
+                           help='report failing commands and commit the rest instead of rolling back')
+    return parser.parse_args(argv)
+
+
+def _fields(pairs):
+    fields = {}
+    for pair in pairs:
+        field, sep, value = pair.partition('=')
+        if not sep:
+            raise BatchError(f"expected field=value, got {pair!r}")
+        fields[field] = value
+    return fields
+
+
+#the arguments of a single add/edit/delete/list/search as batch commands
+def _commands(args):
+    if args.command == 'add':
+        return [(1, dict(_fields(args.fields), op='add', table=args.table))]
+    if args.command == 'edit':
+        return [(1, dict(_fields(args.fields), op='edit', table=args.table, id=args.id))]
+    if args.command == 'delete':
+        return [(n, {'op': 'delete', 'table': args.table, 'id': id}) for n, id in enumerate(args.ids, 1)]
+    if args.command == 'list':
+        return [(1, {'op': 'list', 'table': args.table})]
+    return [(1, {'op': 'search', 'name': args.name, 'limit': args.limit})]
+
+
+def run_batch(args) -> int:
+    dao = open_dao(CONFIGFILE, SECTION)
+    dao.connect()
+    dao.create_tables()
+    batch = ZooBatch(dao, keep_going=args.keep_going)
+    committed = False
+    f = None
+    try:
+        if args.command == 'exec-file':
+            f = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+            commands = read_commands(f)
+        else:
+            commands = _commands(args)
+        for result in batch.run(commands):
+            print(dumps(result))
+        committed = True
+    except (psycopg2.Error, BatchError) as e:
+        logging.error(e)
+        if not batch.failed:
+            print(dumps({'ok': False, 'error': str(e).strip()}))
+    finally:
+        if f is not None and f is not sys.stdin:
+            f.close()
+        dao.close()
+    print(dumps({'op': 'summary', 'commands': batch.commands, 'failed': batch.failed, 'committed': committed}))
+    return 0 if committed and not batch.failed else 1
+
+
+def run_import(args) -> None:
+    files = {table: getattr(args, table) for table in TABLE_ORDER if getattr(args, table)}
+    if not files:
+        print('Nothing to import, pass at least one of ' + ', '.join(f'--{t}' for t in TABLE_ORDER))
+        return
+    dao = open_dao(CONFIGFILE, SECTION)
+    if dao.backend != 'postgresql':
+        print(f"import loads with COPY and needs the postgresql backend, not {dao.backend}")
+        return
+    dao.connect()
+    dao.create_tables()
+    results = ZooBulkLoader(dao).load_many(files)
+    for table, (inserted, skipped) in results.items():
+        print(f"{table}: {inserted} rows imported, {skipped} skipped (unresolved names)")
+    dao.close()
+
+
+def run_migrate(args) -> None:
+    dao = open_dao(CONFIGFILE, SECTION)
+    dao.connect()
+    if dao.backend == 'sqlite':
+        # the sqlite schema has its own migrations, create_tables() runs them
+        dao.create_tables()
+        print(f"Schema version {dao.schema_version()} of {dao.latest_version()} (sqlite, {dao.path})")
+        dao.close()
+        return
+    migrator = ZooMigrator(dao)
+    if not args.status:
+        applied = migrator.migrate()
+        print(f"Applied migrations: {', '.join(map(str, applied)) or 'none'}")
+        if migrator.skipped:
+            print(f"Skipped optional migrations (see error.log): {', '.join(map(str, migrator.skipped))}")
+    print(f"Schema version {migrator.current_version()} of {migrator.latest_version()}")
+    for table, index, scans, size in migrator.indexes():
+        print(f"{table}.{index}: {scans} scans, {size}")
+    dao.close()
+
+
+def run_export(args) -> None:
+    dao = open_dao(CONFIGFILE, SECTION)
+    dao.connect()
+    dao.create_tables()
+    try:
+        columns = [column.strip() for column in args.columns.split(',')] if args.columns else None
+        rows = ZooExporter(dao, args.batch_size).export(args.table, args.output, args.format, args.compress,
+                                                        columns)
+    except ValueError as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return
+    finally:
+        dao.close()
+    # stdout may be the export itself
+    print(f"{args.table}: {rows} rows exported to {args.output}",
+          file=sys.stderr if args.output == '-' else sys.stdout)
+
+
+def run_bench_prepared(args) -> None:
+    dao = open_dao(CONFIGFILE, SECTION)
+    dao.connect()
+    dao.create_tables()
+    if not dao.use_prepared:
+        print(f"PREPARE is off for the {dao.backend} backend, nothing to compare")
+        dao.close()
+        return
+    for name, adhoc, prepared in zooStatements.benchmark(dao, args.bench_prepared):
+        if prepared is None:
+            print(f"{name}: ad-hoc {adhoc:.0f} ops/s, not prepared")
+        else:
+            print(f"{name}: ad-hoc {adhoc:.0f} ops/s, prepared {prepared:.0f} ops/s ({prepared / adhoc:.2f}x)")
+    dao.close()
 
 
 def main() -> None:
+    args = parse_args()
     try:
+        if args.bench_prepared:
+            run_bench_prepared(args)
+            return
+        if args.command == 'import':
+            run_import(args)
+            return
+        if args.command == 'migrate':
+            run_migrate(args)
+            return
+        if args.command == 'export':
+            run_export(args)
+            return
+        if args.command in ('add', 'edit', 'delete', 'list', 'search', 'exec-file'):
+            sys.exit(run_batch(args))
         # Run the ZooInput application
-        app = ZooInput('zoo/database.ini', 'postgresql')
+        app = ZooInput(CONFIGFILE, SECTION)
         app.run()
     except psycopg2.OperationalError as e:
         print(f"Unable to connect to database: {e}")
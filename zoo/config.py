@@ -4,20 +4,35 @@ class ConfigReader():
 
     def __init__(self, configfile, section) -> None:
         self.configfile, self.section = configfile, section
+        self._parser = None
+
+    # the file is read once, connect() asks for several sections
+    def _read(self):
+        if self._parser is None:
+            self._parser = ConfigParser()
+            self._parser.read(self.configfile)
+        return self._parser
 
     # def config(filename='database.ini', section='postgresql'):
-    def config(self):
-        # create a parser
-        parser = ConfigParser()
+    def config(self, section=None):
+        # default to the section given to the constructor
+        section = section or self.section
         # read config file
-        parser.read(self.configfile)
+        parser = self._read()
 
         # get section, default to postgresql
         db = {}
-        if parser.has_section(self.section):
-            params = parser.items(self.section)
+        if parser.has_section(section):
+            params = parser.items(section)
             for param in params:
                 db[param[0]] = param[1]
         else:
-            raise Exception('Section {0} not found in the {1} file'.format(self.section, self.configfile))
-        return db
\ No newline at end of file
+            raise Exception('Section {0} not found in the {1} file'.format(section, self.configfile))
+        return db
+
+    # optional sections (pool, ...) only switch features on when present
+    def has_section(self, section):
+        return self._read().has_section(section)
+
+    def sections(self):
+        return self._read().sections()
@@ -1,10 +1,66 @@
 import psycopg2
+import psycopg2.extensions
 import logging
 import datetime
+import time
+import threading
+import itertools
+import re
+import weakref
+from contextlib import contextmanager
 from zoo.config import ConfigReader
+from zoo.zooPool import ZooPool
+from zoo.zooMigrations import ZooMigrator, SEARCH_COLUMNS, fingerprint, read_fingerprint, store_fingerprint
+from zoo.zooCache import ZooCache, cached
+from zoo.zooStatements import StatementRegistry
+from zoo.zooMetrics import ZooMetrics, timed_cursor
+from zoo.zooReplicas import ReplicaSet
+from zoo.zooPaging import Page, PAGE_SIZE, parse_token, make_page
+from zoo.zooRows import STATEMENT_ROWS, AnimalOverview, projection, row_cursor
+from zoo.zooNotify import ZooListener
+
+
+class TransactionAborted(psycopg2.Error):
+    pass
+
+
+class _Savepoint:
+
+    def __init__(self, name):
+        self.name = name
+        # set when a DAO call inside the savepoint failed and was rolled back
+        self.error = None
+
+
+class _Transaction:
+
+    def __init__(self, conn, cur, flush_every):
+        self.conn, self.cur = conn, cur
+        self.flush_every = flush_every
+        self.pending = 0
+        self.flushes = 0
+        self.savepoints = []
+        self.error = None
+        # cache evictions of the writes so far, run once they are committed
+        self.evictions = []
+
+    # a failed statement only undoes the innermost savepoint, without one
+    # the whole transaction is lost
+    def fail(self, error):
+        if self.savepoints:
+            savepoint = self.savepoints[-1]
+            self.cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint.name}")
+            savepoint.error = error
+        else:
+            self.conn.rollback()
+            self.error = error
+
 
 class zooApp(ConfigReader):
 
+    # [backend] engine= of zooBackends
+    backend = 'postgresql'
+
     #DB verbindung
     def __init__(self, configfile, section):
         super().__init__(configfile, section)
@@ -12,77 +68,447 @@ class zooApp(ConfigReader):
         logging.basicConfig(filename='zoo/error.log', level=logging.ERROR, format=log_format)
         self.conn = None
         self.cur = None
+        self.pool = None
+        # single connection mode shares one cursor, so callers take turns
+        self._lock = threading.RLock()
+        # rows per fetchmany round trip for the stream_all_* methods
+        self.batch_size = 2000
+        self._stream_ids = itertools.count(1)
+        # open transaction() per thread, commit every n statements (0 = only at the end)
+        self._local = threading.local()
+        self.flush_every = 0
+        # read-through cache for get_*_by_id, enabled by a [cache] section
+        self.cache = None
+        # a set based change of more rows clears the namespace instead of
+        # evicting them one by one
+        self.bulk_evict = 1000
+        # when the animal overview view is refreshed: lazy or manual
+        self.overview_refresh = 'lazy'
+        # named SQL of every DAO method, PREPAREd once per connection
+        self.statements = StatementRegistry()
+        self.use_prepared = True
+        self._prepared = weakref.WeakKeyDictionary()
+        # pg_trgm installed? None = not checked yet
+        self._trigram = None
+        # schemas known to be current, create_tables() skips them ([schema] cache=)
+        self.schema_cache = 'zoo/schema_cache.json'
+        # per statement latency and slow query log, only with a [metrics] section
+        self.metrics = None
+        # read only replicas ([replica] sections), reads stay on the primary
+        # for sticky seconds after a write so they see it
+        self.replicas = None
+        self.sticky = 5.0
+        self._last_write = 0.0
+        # evicts cache entries other processes changed ([cache] listen=)
+        self.listener = None
+
+    #the optional sections every backend understands
+    def _configure(self):
+        if self.has_section('streaming'):
+            self.batch_size = int(self.config('streaming').get('batch_size', self.batch_size))
+        if self.has_section('transaction'):
+            self.flush_every = int(self.config('transaction').get('flush_every', self.flush_every))
+        if self.has_section('overview'):
+            self.overview_refresh = self.config('overview').get('refresh', self.overview_refresh)
+        if self.has_section('statements'):
+            self.use_prepared = self.config('statements').get('prepare', 'true').lower() in ('1', 'true', 'yes', 'on')
+        if self.has_section('schema'):
+            self.schema_cache = self.config('schema').get('cache', self.schema_cache) or None
+        if self.has_section('cache'):
+            self.cache = ZooCache.from_config(self.config('cache'))
+        if self.has_section('metrics'):
+            options = self.config('metrics')
+            if options.get('enabled', 'true').lower() in ('1', 'true', 'yes', 'on'):
+                self.metrics = ZooMetrics.from_config(options)
 
     def connect(self):
         try:
             params = self.config()
-            self.conn = psycopg2.connect(**params)
-            self.cur = self.conn.cursor()
+            self._configure()
+            # every cursor of every connection reports to the metrics and
+            # returns the row classes of zooRows
+            base = psycopg2.extensions.cursor if self.metrics is None else timed_cursor(self.metrics)
+            params = dict(params, cursor_factory=row_cursor(base))
+            self.replicas = ReplicaSet.from_config(self, params)
+            if self.has_section('routing'):
+                self.sticky = float(self.config('routing').get('sticky', self.sticky))
+            if self.has_section('pool'):
+                self.pool = ZooPool.from_config(params, self.config('pool'))
+            else:
+                self.conn = psycopg2.connect(**params)
+                self.cur = self.conn.cursor()
+            if self.cache is not None and self.config('cache').get('listen', 'true').lower() in ('1', 'true', 'yes', 'on'):
+                # on the primary, standbys do not pass notifications on
+                self.listener = ZooListener(self.config(), self._on_change, self.cache.clear)
+                self.listener.start()
         except psycopg2.OperationalError as e:
             timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             error_message = f"{timestamp} - {str(e)}"
             logging.error(error_message)
             raise e
 
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn, self.cur = None, None
+        if self.replicas is not None:
+            self.replicas.closeall()
+            self.replicas = None
+        if self.metrics is not None:
+            self.metrics.close()
+
+    #borrow a cursor: pooled connection per call or the shared one
+    #name= gives a server side cursor that is closed again on exit
+    @contextmanager
+    def cursor(self, name=None):
+        tx = self._tx()
+        if tx is not None:
+            self._ensure_prepared(tx.conn)
+            cur = tx.cur if name is None else tx.conn.cursor(name=name)
+            try:
+                if tx.error is not None:
+                    raise TransactionAborted(f"transaction already rolled back: {tx.error}")
+                yield cur
+            except psycopg2.Error as e:
+                if not isinstance(e, TransactionAborted):
+                    tx.fail(e)
+                raise
+            finally:
+                if name is not None and not cur.closed:
+                    cur.close()
+            return
+        if self.pool is None:
+            with self._lock:
+                self._ensure_prepared(self.conn)
+                cur = self.cur if name is None else self.conn.cursor(name=name)
+                try:
+                    yield cur
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                finally:
+                    if name is not None and not cur.closed:
+                        cur.close()
+            return
+        conn = self._getconn()
+        try:
+            self._ensure_prepared(conn)
+            with conn.cursor(name=name) as cur:
+                yield cur
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    #cursor for a read: a replica when there are any, the primary inside a
+    #transaction or primary_reads(), shortly after a write, or when no
+    #replica is healthy
+    @contextmanager
+    def read_cursor(self, name=None):
+        picked = None
+        if (self.replicas is not None and self._tx() is None and not getattr(self._local, 'primary', False)
+                and time.monotonic() - self._last_write >= self.sticky):
+            picked = self.replicas.getconn()
+        if picked is None:
+            with self.cursor(name) as cur:
+                yield cur
+            return
+        replica, conn = picked
+        error = None
+        try:
+            self._ensure_prepared(conn, self.statements.reads)
+            with conn.cursor(name=name) as cur:
+                yield cur
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.replicas.putconn(replica, conn, error)
+
+    #reads in the block go to the primary, like the ones that fill the cache:
+    #a replica behind a change notification would cache the old row again
+    @contextmanager
+    def primary_reads(self):
+        previous = getattr(self._local, 'primary', False)
+        self._local.primary = True
+        try:
+            yield
+        finally:
+            self._local.primary = previous
+
+    def _getconn(self):
+        start = time.perf_counter()
+        conn = self.pool.getconn()
+        if self.metrics is not None:
+            self.metrics.record_wait((time.perf_counter() - start) * 1000)
+        return conn
+
+    #prepare lazily on the first idle checkout of each connection, a
+    #connection inside a transaction runs ad-hoc until it is idle again;
+    #replicas only get the reads (names)
+    def _ensure_prepared(self, conn, names=None):
+        if not self.use_prepared or conn in self._prepared:
+            return
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return
+        self._prepared[conn] = self.statements.prepare(conn, names)
+
+    def prepared_statements(self, conn):
+        return self._prepared.get(conn, set())
+
+    #run a registry statement: EXECUTE when prepared here, plain SQL otherwise;
+    #reads fetch the row class STATEMENT_ROWS has for them
+    def execute(self, cur, name, params=()):
+        if name in self._prepared.get(cur.connection, ()):
+            sql = self.statements.execute_sql(name)
+        else:
+            sql = self.statements.sql(name)
+        row = STATEMENT_ROWS.get(name)
+        if row is None:
+            cur.execute(sql, params)
+        else:
+            cur.execute(sql, params, row=row)
+
+    #a view_all_* statement, or only some columns of its table
+    def select(self, cur, name, table, columns=None):
+        if columns is None:
+            self.execute(cur, name)
+        else:
+            sql, row = projection(table, columns)
+            cur.execute(sql, row=row)
+
+    def _tx(self):
+        return getattr(self._local, 'tx', None)
+
+    #mutating methods commit through here, inside transaction() it is deferred
+    #wrote=False for a statement that changed nothing, so reads may keep
+    #going to the replicas
+    def commit(self, cur, wrote=True):
+        if wrote:
+            self._last_write = time.monotonic()
+        tx = self._tx()
+        if tx is None:
+            cur.connection.commit()
+            return
+        tx.pending += 1
+        self.flush()
+
+    #commit inside transaction() once flush_every statements are waiting;
+    #not while a savepoint is open, callers writing in one flush after it
+    def flush(self):
+        tx = self._tx()
+        if tx is None or not tx.flush_every or tx.pending < tx.flush_every or tx.savepoints:
+            return
+        tx.conn.commit()
+        tx.pending = 0
+        tx.flushes += 1
+        self._run_evictions(tx)
+
+    #unit of work: every DAO call of this thread runs on one connection and
+    #is committed once at the end, or every flush_every statements
+    @contextmanager
+    def transaction(self, flush_every=None):
+        if self._tx() is not None:
+            yield self._tx()
+            return
+        if self.pool is None:
+            self._lock.acquire()
+            conn, cur = self.conn, self.cur
+        else:
+            conn = self._getconn()
+            cur = conn.cursor()
+        tx = _Transaction(conn, cur, self.flush_every if flush_every is None else flush_every)
+        self._local.tx = tx
+        try:
+            yield tx
+            if tx.error is not None:
+                raise TransactionAborted(f"transaction rolled back: {tx.error}")
+            conn.commit()
+            self._run_evictions(tx)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._local.tx = None
+            if self.pool is None:
+                self._lock.release()
+            else:
+                cur.close()
+                self.pool.putconn(conn)
+
+    #partial rollback inside transaction(): an exception in the block or a
+    #failing DAO call rolls back to here, the outer transaction goes on
+    @contextmanager
+    def savepoint(self):
+        tx = self._tx()
+        if tx is None:
+            raise RuntimeError("savepoint() needs an open transaction()")
+        savepoint = _Savepoint(f"zoo_sp_{len(tx.savepoints) + 1}")
+        tx.cur.execute(f"SAVEPOINT {savepoint.name}")
+        tx.savepoints.append(savepoint)
+        try:
+            yield savepoint
+        except Exception:
+            tx.cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint.name}")
+            raise
+        finally:
+            tx.savepoints.pop()
+        tx.cur.execute(f"RELEASE SAVEPOINT {savepoint.name}")
+
+    #streaming reads: rows come in fetchmany batches from a named cursor
+    def stream(self, sql, params=None, batch_size=None, row=None):
+        batch_size = batch_size or self.batch_size
+        name = f"zoo_stream_{next(self._stream_ids)}"
+        with self.read_cursor(name) as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params, row=row)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    #keyset paging: WHERE id > last ORDER BY id LIMIT n, the same cost for
+    #every page however deep; token is None (first page) or page.next/previous
+    def page(self, name, token=None, limit=None):
+        limit = limit or PAGE_SIZE
+        direction, key = parse_token(token)
+        with self.read_cursor() as cur:
+            self.execute(cur, name if direction == 'after' else f"{name}_before", (key, limit + 1))
+            rows = cur.fetchall()
+            if not rows and direction == 'before':
+                # everything before was deleted meanwhile, start over
+                direction, key = 'after', 0
+                self.execute(cur, name, (key, limit + 1))
+                rows = cur.fetchall()
+            earlier = False
+            if direction == 'after' and key:
+                # one index probe, so previous is only offered when there is a page
+                self.execute(cur, f"{name}_before", (rows[0][0] if rows else key + 1, 1))
+                earlier = bool(cur.fetchall())
+        return make_page(rows, direction, key, limit, earlier)
+
+    #edits evict the row, deletes also evict the rows the FK cascade removed;
+    #inside transaction() only after the commit, until then another thread
+    #could cache the old row again. Public for writes that do not go
+    #through the DAO methods (zooBatch); key as the table stores it, None
+    #for every row of the namespace
+    def evict(self, namespace, key, cascade=False):
+        if self.cache is None:
+            return
+        tx = self._tx()
+        if tx is not None:
+            tx.evictions.append((namespace, key, cascade))
+        else:
+            self._invalidate(namespace, key, cascade)
+
+    def _invalidate(self, namespace, key, cascade):
+        if key is None:
+            self.cache.clear(namespace, cascade)
+        elif cascade:
+            self.cache.invalidate_cascade(namespace, key)
+        else:
+            self.cache.invalidate(namespace, key)
+
+    def _run_evictions(self, tx):
+        evictions, tx.evictions = tx.evictions, []
+        for namespace, key, cascade in evictions:
+            self._invalidate(namespace, key, cascade)
+
+    #a change notification of migration 6, from this or any other process;
+    #new rows cannot be cached yet (misses are not cached)
+    def _on_change(self, table, op, ids):
+        if op == 'INSERT':
+            return
+        if ids is None:
+            self.cache.clear(table)
+        else:
+            for key in ids:
+                self.evict(table, key, cascade=op == 'DELETE')
+
+    def cache_stats(self):
+        if self.cache is None:
+            return None
+        stats = self.cache.stats()
+        if self.listener is not None:
+            stats['listener'] = self.listener.stats()
+        return stats
+
+    def metrics_json(self):
+        if self.metrics is None:
+            return None
+        return self.metrics.to_json()
+
+    def replica_stats(self):
+        if self.replicas is None:
+            return None
+        return self.replicas.stats()
+
+    def pool_stats(self):
+        if self.pool is None:
+            return None
+        return self.pool.stats()
+
     def __repr__(self):
+        if self.pool is not None:
+            stats = self.pool.stats()
+            dsn_parameters = self.pool.params
+            return (f"Connection pool for database '{dsn_parameters.get('database')}' on host '{dsn_parameters.get('host')}' as user '{dsn_parameters.get('user')}' "
+                    f"({stats['size']}/{stats['maxconn']} connections, {stats['checkouts']} checkouts, "
+                    f"avg wait {stats['wait_avg'] * 1000:.2f} ms, max wait {stats['wait_max'] * 1000:.2f} ms, "
+                    f"utilization {stats['utilization']:.0%}, {stats['timeouts']} timeouts)")
         if self.conn is not None:
             dsn_parameters = self.conn.get_dsn_parameters()
             return f"Connected to database '{dsn_parameters['dbname']}' on host '{dsn_parameters['host']}' as user '{dsn_parameters['user']}'"
         else:
             return "Not connected to any database"
 
+    #schema is versioned in zooMigrations, nothing to do when it is current
+    #with a matching cached fingerprint there is not even a round trip
     def create_tables(self) -> None:
-        encolsuresql = """
-            CREATE TABLE IF NOT EXISTS enclosure(
-                enclosure_id               SERIAL PRIMARY KEY,
-                name                       VARCHAR(100),
-                size                       INT
-            )"""
-
-        catsql = """
-            CREATE TABLE IF NOT EXISTS animalcat(
-                animalcat_id            SERIAL PRIMARY KEY,
-                category                  VARCHAR(100)              
-            );"""
-        breedsql="""
-            CREATE TABLE IF NOT EXISTS animalbreed(
-                animalbreed_id             SERIAL PRIMARY KEY,
-                breed                      VARCHAR(100),
-                animalcat_id               INTEGER REFERENCES animalcat(animalcat_id) ON DELETE CASCADE
-            );"""
-        
-        keepersql="""
-            CREATE TABLE IF NOT EXISTS keeper(
-                keeper_id                  SERIAL PRIMARY KEY,
-                name                       VARCHAR(100),
-                enclosure_id               INTEGER REFERENCES enclosure(enclosure_id ) ON DELETE CASCADE
-            );"""
-        animalsql="""
-            CREATE TABLE IF NOT EXISTS animal(
-                animal_id                  SERIAL PRIMARY KEY,
-                name                       VARCHAR(100),
-                birthday                   date,
-                animalbreed_id            INTEGER REFERENCES animalbreed(animalbreed_id) ON DELETE CASCADE,
-                enclosure_id               INTEGER REFERENCES enclosure(enclosure_id ) ON DELETE CASCADE
-            );"""
-
-        try:
-            self.cur.execute(encolsuresql)
-            self.cur.execute(catsql)
-            self.cur.execute(breedsql)
-            self.cur.execute(keepersql)
-            self.cur.execute(animalsql)
-            self.conn.commit()
+        params = self.config()
+        key = f"{params.get('host', '')}:{params.get('port', '')}/{params.get('database', params.get('dbname', ''))}"
+        current = fingerprint()
+        if self.schema_cache and read_fingerprint(self.schema_cache, key) == current:
+            return
+        try:
+            migrator = ZooMigrator(self)
+            applied = migrator.migrate()
+            if applied:
+                # pg_trgm may have been installed by a migration, and
+                # statements on tables that did not exist yet need preparing
+                self._trigram = None
+                self._prepared = weakref.WeakKeyDictionary()
+            # a skipped optional migration is tried again on the next startup
+            if self.schema_cache and not migrator.skipped:
+                store_fingerprint(self.schema_cache, key, current)
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
+
+    def trigram_available(self):
+        if self._trigram is None:
+            try:
+                with self.cursor() as cur:
+                    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                    self._trigram = cur.fetchone() is not None
+            except psycopg2.Error as e:
+                logging.error(e)
+                return False
+        return self._trigram
 
     #CRUD enclosure
-    def view_all_enclosures(self):
-        sql = "SELECT * FROM enclosure"
+    def view_all_enclosures(self, columns=None):
         try:
-            self.cur.execute(sql)
-            enclosures = self.cur.fetchall()
+            with self.read_cursor() as cur:
+                self.select(cur, "view_all_enclosures", "enclosure", columns)
+                enclosures = cur.fetchall()
             return enclosures
         except psycopg2.Error as e:
             logging.error(e)
@@ -90,64 +516,79 @@ class zooApp(ConfigReader):
             return []
 
 
+    def stream_all_enclosures(self, batch_size=None, columns=None):
+        sql, row = projection("enclosure", columns)
+        try:
+            yield from self.stream(sql, batch_size=batch_size, row=row)
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while streaming enclosures.")
+
+
+    def page_enclosures(self, token=None, limit=None):
+        try:
+            return self.page("page_enclosures", token, limit)
+        except (psycopg2.Error, ValueError) as e:
+            logging.error(e)
+            print("Error occurred while retrieving enclosures.")
+            return Page([], None, None)
+
+
     def add_enclosure(self, name, size):
-        sql = "INSERT INTO enclosure (name, size) VALUES (%s, %s) RETURNING enclosure_id"
         try:
-            self.cur.execute(sql, (name, size))
-            self.conn.commit()
-            enclosure_id = self.cur.fetchone()[0]
+            with self.cursor() as cur:
+                self.execute(cur, "add_enclosure", (name, size))
+                self.commit(cur)
+                enclosure_id = cur.fetchone()[0]
             print(f"Enclosure with ID {enclosure_id} added successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while adding enclosure.")
 
 
     def edit_enclosure(self, enclosure_id, name, size):
-        sql = "UPDATE enclosure SET name = %s, size = %s WHERE enclosure_id = %s"
         try:
-            self.cur.execute(sql, (name, size, enclosure_id))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "edit_enclosure", (name, size, enclosure_id))
+                self.commit(cur)
+            self.evict('enclosure', enclosure_id)
             print(f"Enclosure with ID {enclosure_id} updated successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while editing enclosure.")
 
 
     def delete_enclosure(self, enclosure_id):
-        sql = "DELETE FROM enclosure WHERE enclosure_id = %s"
         try:
-            self.cur.execute(sql, (enclosure_id,))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "delete_enclosure", (enclosure_id,))
+                self.commit(cur)
+            self.evict('enclosure', enclosure_id, cascade=True)
             print(f"Enclosure with ID {enclosure_id} deleted successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while deleting enclosure.")
 
 
+    #the Enclosure row, None when there is no such enclosure
+    @cached('enclosure')
     def get_enclosure_by_id(self, enclosure_id):
-        sql = "SELECT name, size FROM enclosure WHERE enclosure_id = %s"
         try:
-            self.cur.execute(sql, (enclosure_id,))
-            result = self.cur.fetchone()
-            if result:
-                return result
-            else:
-                return "N/A"
+            with self.read_cursor() as cur:
+                self.execute(cur, "get_enclosure_by_id", (enclosure_id,))
+                return cur.fetchone()
         except psycopg2.Error as e:
             logging.error(e)
             print("Error occurred while retrieving enclosure.")
-            return "N/A"
+            return None
 
 
     #CRUD cat
-    def view_all_animalcats(self):
-        sql = "SELECT * FROM animalcat"
+    def view_all_animalcats(self, columns=None):
         try:
-            self.cur.execute(sql)
-            animalcats = self.cur.fetchall()
+            with self.read_cursor() as cur:
+                self.select(cur, "view_all_animalcats", "animalcat", columns)
+                animalcats = cur.fetchall()
             return animalcats
         except psycopg2.Error as e:
             logging.error(e)
@@ -155,64 +596,78 @@ class zooApp(ConfigReader):
             return []
 
 
+    def stream_all_animalcats(self, batch_size=None, columns=None):
+        sql, row = projection("animalcat", columns)
+        try:
+            yield from self.stream(sql, batch_size=batch_size, row=row)
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while streaming animal categorys.")
+
+
+    def page_animalcats(self, token=None, limit=None):
+        try:
+            return self.page("page_animalcats", token, limit)
+        except (psycopg2.Error, ValueError) as e:
+            logging.error(e)
+            print("Error occurred while retrieving animal categorys.")
+            return Page([], None, None)
+
+
     def add_animalcat(self, category):
-        sql = "INSERT INTO animalcat (category) VALUES (%s) RETURNING animalcat_id"
         try:
-            self.cur.execute(sql, (category,))
-            self.conn.commit()
-            animalcat_id = self.cur.fetchone()[0]
+            with self.cursor() as cur:
+                self.execute(cur, "add_animalcat", (category,))
+                self.commit(cur)
+                animalcat_id = cur.fetchone()[0]
             print(f"Animal category with ID {animalcat_id} added successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while adding animal category.")
 
 
     def edit_animalcat(self, animalcat_id, category):
-        sql = "UPDATE animalcat SET category = %s WHERE animalcat_id = %s"
         try:
-            self.cur.execute(sql, (category, animalcat_id))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "edit_animalcat", (category, animalcat_id))
+                self.commit(cur)
+            self.evict('animalcat', animalcat_id)
             print(f"Animal category with ID {animalcat_id} updated successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while editing animal category.")
 
 
     def delete_animalcat(self, animalcat_id):
-        sql = "DELETE FROM animalcat WHERE animalcat_id = %s"
         try:
-            self.cur.execute(sql, (animalcat_id,))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "delete_animalcat", (animalcat_id,))
+                self.commit(cur)
+            self.evict('animalcat', animalcat_id, cascade=True)
             print(f"Animal category with ID {animalcat_id} deleted successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while deleting animal category.")
 
 
+    @cached('animalcat')
     def get_animalcat_by_id(self, animalcat_id):
-        sql = "SELECT category FROM animalcat WHERE animalcat_id = %s"
         try:
-            self.cur.execute(sql, (animalcat_id,))
-            result = self.cur.fetchone()
-            if result:
-                return result[0]
-            else:
-                return "N/A"
+            with self.read_cursor() as cur:
+                self.execute(cur, "get_animalcat_by_id", (animalcat_id,))
+                return cur.fetchone()
         except psycopg2.Error as e:
             logging.error(e)
             print("Error occurred while retrieving animal category.")
-            return "N/A"
+            return None
 
 
     #CRUD breed
-    def view_all_animalbreed(self):
-        sql = "SELECT * FROM animalbreed"
+    def view_all_animalbreed(self, columns=None):
         try:
-            self.cur.execute(sql)
-            animalbreed = self.cur.fetchall()
+            with self.read_cursor() as cur:
+                self.select(cur, "view_all_animalbreed", "animalbreed", columns)
+                animalbreed = cur.fetchall()
             return animalbreed
         except psycopg2.Error as e:
             logging.error(e)
@@ -220,63 +675,77 @@ class zooApp(ConfigReader):
             return []
 
 
+    def stream_all_animalbreed(self, batch_size=None, columns=None):
+        sql, row = projection("animalbreed", columns)
+        try:
+            yield from self.stream(sql, batch_size=batch_size, row=row)
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while streaming animal breeds.")
+
+
+    def page_animalbreed(self, token=None, limit=None):
+        try:
+            return self.page("page_animalbreed", token, limit)
+        except (psycopg2.Error, ValueError) as e:
+            logging.error(e)
+            print("Error occurred while retrieving animal breeds.")
+            return Page([], None, None)
+
+
     def add_animalbreed(self, breed, animalcat_id):
-        sql = "INSERT INTO animalbreed (breed, animalcat_id) VALUES (%s, %s) RETURNING animalbreed_id"
         try:
-            self.cur.execute(sql, (breed, animalcat_id))
-            self.conn.commit()
-            animalbreed_id = self.cur.fetchone()[0]
+            with self.cursor() as cur:
+                self.execute(cur, "add_animalbreed", (breed, animalcat_id))
+                self.commit(cur)
+                animalbreed_id = cur.fetchone()[0]
             print(f"Animal breed with ID {animalbreed_id} added successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while adding animal breed.")
 
 
     def edit_animalbreed(self, animalbreed_id, breed, animalcat_id):
-        sql = "UPDATE animalbreed SET breed = %s, animalcat_id = %s WHERE animalbreed_id = %s"
         try:
-            self.cur.execute(sql, (breed, animalcat_id, animalbreed_id))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "edit_animalbreed", (breed, animalcat_id, animalbreed_id))
+                self.commit(cur)
+            self.evict('animalbreed', animalbreed_id)
             print(f"Animal breed with ID {animalbreed_id} updated successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while editing animal breed.")
 
 
     def delete_animalbreed(self, animalbreed_id):
-        sql = "DELETE FROM animalbreed WHERE animalbreed_id = %s"
         try:
-            self.cur.execute(sql, (animalbreed_id,))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "delete_animalbreed", (animalbreed_id,))
+                self.commit(cur)
+            self.evict('animalbreed', animalbreed_id, cascade=True)
             print(f"Animal breed with ID {animalbreed_id} deleted successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while deleting animal breed.")
 
 
+    @cached('animalbreed')
     def get_animalbreed_by_id(self, animalbreed_id):
-        sql = "SELECT breed, animalcat_id FROM animalbreed WHERE animalbreed_id = %s"
         try:
-            self.cur.execute(sql, (animalbreed_id,))
-            result = self.cur.fetchone()
-            if result:
-                return result[0], result[1]
-            else:
-                return "N/A", "N/A"
+            with self.read_cursor() as cur:
+                self.execute(cur, "get_animalbreed_by_id", (animalbreed_id,))
+                return cur.fetchone()
         except psycopg2.Error as e:
             logging.error(e)
             print("Error occurred while retrieving animal breed.")
-            return "N/A", "N/A"
+            return None
 
     #CRUD keeper
-    def view_all_keepers(self):
-        sql = "SELECT * FROM keeper"
+    def view_all_keepers(self, columns=None):
         try:
-            self.cur.execute(sql)
-            keepers = self.cur.fetchall()
+            with self.read_cursor() as cur:
+                self.select(cur, "view_all_keepers", "keeper", columns)
+                keepers = cur.fetchall()
             return keepers
         except psycopg2.Error as e:
             logging.error(e)
@@ -284,63 +753,88 @@ class zooApp(ConfigReader):
             return []
 
 
+    def stream_all_keepers(self, batch_size=None, columns=None):
+        sql, row = projection("keeper", columns)
+        try:
+            yield from self.stream(sql, batch_size=batch_size, row=row)
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while streaming keepers.")
+
+
+    def page_keepers(self, token=None, limit=None):
+        try:
+            return self.page("page_keepers", token, limit)
+        except (psycopg2.Error, ValueError) as e:
+            logging.error(e)
+            print("Error occurred while retrieving keepers.")
+            return Page([], None, None)
+
+
     def add_keeper(self, name, enclosure_id):
-        sql = "INSERT INTO keeper (name, enclosure_id) VALUES (%s, %s) RETURNING keeper_id"
         try:
-            self.cur.execute(sql, (name, enclosure_id))
-            self.conn.commit()
-            keeper_id = self.cur.fetchone()[0]
+            with self.cursor() as cur:
+                self.execute(cur, "add_keeper", (name, enclosure_id))
+                self.commit(cur)
+                keeper_id = cur.fetchone()[0]
             print(f"Keeper with ID {keeper_id} added successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while adding keeper.")
 
 
     def edit_keeper(self, keeper_id, name, enclosure_id):
-        sql = "UPDATE keeper SET name = %s, enclosure_id = %s WHERE keeper_id = %s"
         try:
-            self.cur.execute(sql, (name, enclosure_id, keeper_id))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "edit_keeper", (name, enclosure_id, keeper_id))
+                self.commit(cur)
+            self.evict('keeper', keeper_id)
             print(f"Keeper with ID {keeper_id} updated successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while editing keeper.")
 
 
     def delete_keeper(self, keeper_id):
-        sql = "DELETE FROM keeper WHERE keeper_id = %s"
         try:
-            self.cur.execute(sql, (keeper_id,))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "delete_keeper", (keeper_id,))
+                self.commit(cur)
+            self.evict('keeper', keeper_id, cascade=True)
             print(f"Keeper with ID {keeper_id} deleted successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while deleting keeper.")
 
 
+    @cached('keeper')
     def get_keeper_by_id(self, keeper_id):
-        sql = "SELECT name, enclosure_id FROM keeper WHERE keeper_id = %s"
         try:
-            self.cur.execute(sql, (keeper_id,))
-            result = self.cur.fetchone()
-            if result:
-                return result[0], result[1]
-            else:
-                return "N/A", "N/A"
+            with self.read_cursor() as cur:
+                self.execute(cur, "get_keeper_by_id", (keeper_id,))
+                return cur.fetchone()
         except psycopg2.Error as e:
             logging.error(e)
             print("Error occurred while retrieving keeper.")
-            return "N/A", "N/A"
+            return None
+
+    def view_keepers_by_enclosure(self, enclosure_id):
+        try:
+            with self.read_cursor() as cur:
+                self.execute(cur, "view_keepers_by_enclosure", (enclosure_id,))
+                keepers = cur.fetchall()
+            return keepers
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while retrieving keepers.")
+            return []
 
     #CRUD animal
-    def view_all_animals(self):
-        sql = "SELECT * FROM animal"
+    def view_all_animals(self, columns=None):
         try:
-            self.cur.execute(sql)
-            animals = self.cur.fetchall()
+            with self.read_cursor() as cur:
+                self.select(cur, "view_all_animals", "animal", columns)
+                animals = cur.fetchall()
             return animals
         except psycopg2.Error as e:
             logging.error(e)
@@ -348,63 +842,132 @@ class zooApp(ConfigReader):
             return []
 
 
+    def stream_all_animals(self, batch_size=None, columns=None):
+        sql, row = projection("animal", columns)
+        try:
+            yield from self.stream(sql, batch_size=batch_size, row=row)
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while streaming animals.")
+
+
+    def page_animals(self, token=None, limit=None):
+        try:
+            return self.page("page_animals", token, limit)
+        except (psycopg2.Error, ValueError) as e:
+            logging.error(e)
+            print("Error occurred while retrieving animals.")
+            return Page([], None, None)
+
+
     def add_animal(self, name, birthday, breed_id, enclosure_id):
-        sql = "INSERT INTO animal (name, birthday, animalbreed_id, enclosure_id) VALUES (%s, %s, %s, %s) RETURNING animal_id"
         try:
-            self.cur.execute(sql, (name, birthday, breed_id, enclosure_id))
-            self.conn.commit()
-            animal_id = self.cur.fetchone()[0]
+            with self.cursor() as cur:
+                self.execute(cur, "add_animal", (name, birthday, breed_id, enclosure_id))
+                self.commit(cur)
+                animal_id = cur.fetchone()[0]
             print(f"Animal with ID {animal_id} added successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while adding animal.")
 
 
     def edit_animal(self, animal_id, name, birthday, breed_id, enclosure_id):
-        sql = "UPDATE animal SET name = %s, birthday = %s, animalbreed_id = %s, enclosure_id = %s WHERE animal_id = %s"
         try:
-            self.cur.execute(sql, (name, birthday, breed_id, enclosure_id, animal_id))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "edit_animal", (name, birthday, breed_id, enclosure_id, animal_id))
+                self.commit(cur)
+            self.evict('animal', animal_id)
             print(f"Animal with ID {animal_id} updated successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while editing animal.")
 
 
     def delete_animal(self, animal_id):
-        sql = "DELETE FROM animal WHERE animal_id = %s"
         try:
-            self.cur.execute(sql, (animal_id,))
-            self.conn.commit()
+            with self.cursor() as cur:
+                self.execute(cur, "delete_animal", (animal_id,))
+                self.commit(cur)
+            self.evict('animal', animal_id, cascade=True)
             print(f"Animal with ID {animal_id} deleted successfully.")
         except psycopg2.Error as e:
             logging.error(e)
-            self.conn.rollback()
             print("Error occurred while deleting animal.")
 
 
+    @cached('animal')
     def get_animal_by_id(self, animal_id):
-        sql = "SELECT name, birthday, animalbreed_id, enclosure_id FROM animal WHERE animal_id = %s"
         try:
-            self.cur.execute(sql, (animal_id,))
-            result = self.cur.fetchone()
-            if result:
-                return result[0], result[1], result[2], result[3]
-            else:
-                return "N/A", "N/A", "N/A", "N/A"
+            with self.read_cursor() as cur:
+                self.execute(cur, "get_animal_by_id", (animal_id,))
+                return cur.fetchone()
         except psycopg2.Error as e:
             logging.error(e)
             print("Error occurred while retrieving animal.")
-            return "N/A", "N/A", "N/A", "N/A"
+            return None
+
+    #animal overview: names instead of ids, from the animal_overview view
+    #lazy = refresh before a read when a write changed the tables since the
+    #last refresh (migration 9), manual = only refresh_overview(); False when
+    #nothing changed or another client is refreshing right now
+    def refresh_overview(self, force=False):
+        try:
+            with self.cursor() as cur:
+                cur.execute("SELECT zoo_refresh_overview(%s)", (force,))
+                refreshed = cur.fetchone()[0]
+                # only the view changed, reads may stay on the replicas
+                self.commit(cur, wrote=False)
+            return refreshed
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while refreshing the animal overview.")
+            return False
+
+    def view_animal_overview(self):
+        if self.overview_refresh == 'lazy':
+            self.refresh_overview()
+        try:
+            with self.read_cursor() as cur:
+                self.execute(cur, "view_animal_overview")
+                animals = cur.fetchall()
+            return animals
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while retrieving the animal overview.")
+            return []
+
+    def stream_animal_overview(self, batch_size=None):
+        if self.overview_refresh == 'lazy':
+            self.refresh_overview()
+        try:
+            yield from self.stream(self.statements.sql("view_animal_overview"), batch_size=batch_size,
+                                   row=AnimalOverview)
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while streaming the animal overview.")
+
+    def page_animal_overview(self, token=None, limit=None):
+        if self.overview_refresh == 'lazy':
+            self.refresh_overview()
+        try:
+            return self.page("page_animal_overview", token, limit)
+        except (psycopg2.Error, ValueError) as e:
+            logging.error(e)
+            print("Error occurred while retrieving the animal overview.")
+            return Page([], None, None)
 
     #search function animal name
-    def search_animal_name(self, name):
-        sql = "SELECT * FROM animal WHERE name ILIKE %s"
+    #substring match, best trigram similarity first, limit/offset for paging
+    def search_animal_name(self, name, limit=None, offset=0):
+        pattern = '%' + name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
         try:
-            self.cur.execute(sql, ('%' + name + '%',))
-            animals = self.cur.fetchall()
+            with self.read_cursor() as cur:
+                if self.trigram_available():
+                    self.execute(cur, "search_animal_name", (pattern, name, limit, offset))
+                else:
+                    self.execute(cur, "search_animal_name_plain", (pattern, limit, offset))
+                animals = cur.fetchall()
             return animals
         except psycopg2.Error as e:
             logging.error(e)
@@ -413,23 +976,123 @@ class zooApp(ConfigReader):
 
 
 
+    #'kal lion' -> 'kal:* & lion:*', every word as a prefix; only letters and
+    #digits get through, so nothing the user types is tsquery syntax
+    def _search_query(self, words):
+        return ' & '.join(f"{word}:*" for word in words)
+
+    #ranked search over the names of all tables (or of kinds, e.g.
+    #['animal', 'keeper']); SearchHit rows, limit/offset for paging
+    def search(self, text, kinds=None, limit=None, offset=0):
+        words = re.findall(r"[^\W_]+", text.lower())
+        if not words:
+            return []
+        kinds = list(SEARCH_COLUMNS) if kinds is None else list(kinds)
+        try:
+            with self.read_cursor() as cur:
+                self.execute(cur, "search", (self._search_query(words), kinds, limit, offset))
+                return cur.fetchall()
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while searching.")
+            return []
+
     #filter function for animal breeds by animal categorys
     def filter_breeds_by_category(self, category):
-        sql = """
-            SELECT animalbreed.breed
-            FROM animalbreed
-            JOIN animalcat ON animalbreed.animalcat_id = animalcat.animalcat_id
-            WHERE animalcat.name = %s
-        """
-        try:
-            self.cur.execute(sql, (category,))
-            breeds = self.cur.fetchall()
+        try:
+            with self.read_cursor() as cur:
+                self.execute(cur, "filter_breeds_by_category", (category,))
+                breeds = cur.fetchall()
             return [breed[0] for breed in breeds]
         except psycopg2.Error as e:
             logging.error(e)
             print("Error occurred while filtering breeds by category.")
             return []
 
+    #(breed id, breed, category) for one or several categories in one round trip
+    def filter_breeds_by_categories(self, categories):
+        if isinstance(categories, str):
+            categories = [categories]
+        try:
+            with self.read_cursor() as cur:
+                self.execute(cur, "filter_breeds_by_categories", (list(categories),))
+                breeds = cur.fetchall()
+            return breeds
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while filtering breeds by category.")
+            return []
+
    
 
-    
\ No newline at end of file
+    
+
+
+    #set based changes: every row of an enclosure / breed / category in one
+    #statement and one commit (or as part of transaction()); returns the
+    #number of rows changed, None on error. Only a cache needs the ids
+    def _bulk(self, name, params, namespace, cascade=False):
+        keys = None
+        with self.cursor() as cur:
+            if self.cache is None:
+                self.execute(cur, name, params)
+            else:
+                self.execute(cur, f"{name}_ids", params)
+                keys = [row[0] for row in cur.fetchmany(self.bulk_evict + 1)]
+            count = cur.rowcount
+            self.commit(cur, wrote=count > 0)
+        if keys is not None and len(keys) > self.bulk_evict:
+            self.evict(namespace, None, cascade)
+        elif keys is not None:
+            for key in keys:
+                self.evict(namespace, key, cascade)
+        return count
+
+    def move_animals(self, from_enclosure_id, to_enclosure_id):
+        if from_enclosure_id == to_enclosure_id:
+            print("The animals are already in that enclosure.")
+            return 0
+        try:
+            count = self._bulk("move_animals", (to_enclosure_id, from_enclosure_id), 'animal')
+            print(f"{count} animals moved from enclosure {from_enclosure_id} to enclosure {to_enclosure_id}.")
+            return count
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while moving animals.")
+            return None
+
+    def reassign_keepers(self, from_enclosure_id, to_enclosure_id):
+        if from_enclosure_id == to_enclosure_id:
+            print("The keepers are already assigned to that enclosure.")
+            return 0
+        try:
+            count = self._bulk("reassign_keepers", (to_enclosure_id, from_enclosure_id), 'keeper')
+            print(f"{count} keepers reassigned from enclosure {from_enclosure_id} to enclosure {to_enclosure_id}.")
+            return count
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while reassigning keepers.")
+            return None
+
+    def delete_animals_by_breed(self, animalbreed_id):
+        try:
+            count = self._bulk("delete_animals_by_breed", (animalbreed_id,), 'animal', cascade=True)
+            print(f"{count} animals of breed {animalbreed_id} deleted.")
+            return count
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while deleting animals by breed.")
+            return None
+
+    def retag_breeds(self, from_animalcat_id, to_animalcat_id):
+        if from_animalcat_id == to_animalcat_id:
+            print("The breeds are already in that category.")
+            return 0
+        try:
+            count = self._bulk("retag_breeds", (to_animalcat_id, from_animalcat_id), 'animalbreed')
+            print(f"{count} breeds moved from category {from_animalcat_id} to category {to_animalcat_id}.")
+            return count
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while retagging breeds.")
+            return None
@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import time
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from zoo.config import ConfigReader
+from zoo.zooPool import PoolTimeout
+from zoo.zooStatements import StatementRegistry
+from zoo.zooRows import STATEMENT_ROWS
+
+
+#drive an async psycopg2 connection until the pending operation is done
+async def wait(conn):
+    loop = asyncio.get_running_loop()
+    fd = conn.fileno()
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        future = loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        if state == psycopg2.extensions.POLL_READ:
+            loop.add_reader(fd, ready)
+            try:
+                await future
+            finally:
+                loop.remove_reader(fd)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            loop.add_writer(fd, ready)
+            try:
+                await future
+            finally:
+                loop.remove_writer(fd)
+        else:
+            raise psycopg2.OperationalError(f"bad poll state: {state}")
+
+
+class AsyncZooPool:
+
+    #asyncio counterpart of ZooPool; async connections are always autocommit
+    def __init__(self, params, statements, minconn=1, maxconn=10, timeout=5.0, prepare=True):
+        self.params = params
+        self.statements = statements
+        self.minconn, self.maxconn = minconn, maxconn
+        self.timeout = timeout
+        self.prepare = prepare
+        self._idle = []
+        self._prepared = {}
+        self._slots = asyncio.Semaphore(maxconn)
+        self._in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def open(self):
+        for _ in range(self.minconn):
+            self._idle.append(await self._open())
+
+    async def _open(self):
+        conn = psycopg2.connect(**self.params, async_=True)
+        await wait(conn)
+        return conn
+
+    #like StatementRegistry.prepare: one round trip, and when a statement
+    #fails (e.g. similarity() without pg_trgm) each one on its own; None
+    #while the schema is not migrated, the next checkout tries again
+    async def _prepare(self, conn):
+        names = list(self.statements.statements)
+        prepares = [f"PREPARE zoo_{name} AS {self.statements.numbered(name)}" for name in names]
+        cur = conn.cursor()
+        try:
+            try:
+                cur.execute("DEALLOCATE ALL; " + "; ".join(prepares))
+                await wait(conn)
+                return set(names)
+            except psycopg2.errors.UndefinedTable:
+                cur.execute("DEALLOCATE ALL")
+                await wait(conn)
+                return None
+            except psycopg2.Error as e:
+                logging.error(f"preparing statements failed, retrying one by one: {e}")
+            # the statements before the failing one stay prepared
+            cur.execute("DEALLOCATE ALL")
+            await wait(conn)
+            prepared = set()
+            for name, prepare in zip(names, prepares):
+                try:
+                    cur.execute(prepare)
+                    await wait(conn)
+                    prepared.add(name)
+                except psycopg2.Error as e:
+                    logging.error(f"statement {name} not prepared: {e}")
+            return prepared
+        except psycopg2.Error as e:
+            logging.error(f"preparing statements failed: {e}")
+            return set()
+        finally:
+            cur.close()
+
+    def prepared(self, conn):
+        return self._prepared.get(conn, ())
+
+    async def acquire(self):
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise PoolTimeout(f"no free connection after {self.timeout:.1f}s")
+        conn = None
+        try:
+            conn = self._idle.pop() if self._idle else None
+            if conn is None or conn.closed:
+                conn = await self._open()
+            # on the first checkout, not in open(): the tables may not exist yet
+            if self.prepare and conn not in self._prepared:
+                prepared = await self._prepare(conn)
+                if prepared is not None:
+                    self._prepared[conn] = prepared
+        except BaseException:
+            if conn is not None and not conn.closed:
+                # a cancelled PREPARE may still be running
+                self._prepared.pop(conn, None)
+                conn.close()
+            self._slots.release()
+            raise
+        waited = time.monotonic() - start
+        self._in_use += 1
+        self.checkouts += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    #close=True for connections that may still have a query running
+    def release(self, conn, close=False):
+        if close or conn.closed:
+            self._prepared.pop(conn, None)
+            if not conn.closed:
+                conn.close()
+        else:
+            self._idle.append(conn)
+        self._in_use -= 1
+        self._slots.release()
+
+    async def close(self):
+        for conn in self._idle:
+            conn.close()
+        self._idle = []
+        self._prepared = {}
+
+    def stats(self):
+        in_use = self._in_use
+        return {
+            'size': len(self._idle) + in_use,
+            'idle': len(self._idle),
+            'in_use': in_use,
+            'maxconn': self.maxconn,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_total': self.wait_total,
+            'wait_avg': self.wait_total / self.checkouts if self.checkouts else 0.0,
+            'wait_max': self.wait_max,
+            'utilization': in_use / self.maxconn,
+        }
+
+
+class AsyncZooApp(ConfigReader):
+
+    #asyncio sibling of zooApp: same methods as coroutines, one pooled
+    #connection per call, so independent calls can run with asyncio.gather
+    def __init__(self, configfile, section):
+        super().__init__(configfile, section)
+        self.pool = None
+        self.statements = StatementRegistry()
+
+    async def connect(self):
+        try:
+            params = self.config()
+            options = self.config('pool') if self.has_section('pool') else {}
+            prepare = True
+            if self.has_section('statements'):
+                prepare = self.config('statements').get('prepare', 'true').lower() in ('1', 'true', 'yes', 'on')
+            self.pool = AsyncZooPool(
+                params, self.statements,
+                minconn=int(options.get('minconn', 1)),
+                maxconn=int(options.get('maxconn', 10)),
+                timeout=float(options.get('timeout', 5)),
+                prepare=prepare,
+            )
+            await self.pool.open()
+        except psycopg2.OperationalError as e:
+            logging.error(e)
+            raise e
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def __repr__(self):
+        if self.pool is None:
+            return "Not connected to any database"
+        stats = self.pool.stats()
+        return (f"Async connection pool for database '{self.pool.params.get('database')}' "
+                f"({stats['size']}/{stats['maxconn']} connections, {stats['checkouts']} checkouts, "
+                f"avg wait {stats['wait_avg'] * 1000:.2f} ms)")
+
+    #run one registry statement; fetch = None (rowcount), 'one' or 'all'
+    async def _run(self, name, params=(), fetch=None):
+        conn = await self.pool.acquire()
+        cancelled = False
+        try:
+            cur = conn.cursor()
+            if name in self.pool.prepared(conn):
+                cur.execute(self.statements.execute_sql(name), params)
+            else:
+                cur.execute(self.statements.sql(name), params)
+            await wait(conn)
+            # async connections take no cursor_factory, rows are made here
+            row = STATEMENT_ROWS.get(name)
+            if fetch == 'one':
+                result = cur.fetchone()
+                return row._make(result) if row is not None and result is not None else result
+            if fetch == 'all':
+                rows = cur.fetchall()
+                return rows if row is None else list(map(row._make, rows))
+            return cur.rowcount
+        except asyncio.CancelledError:
+            # the query may still run on the server, don't reuse the connection
+            cancelled = True
+            raise
+        finally:
+            self.pool.release(conn, close=cancelled)
+
+    #independent lookups concurrently: await dao.batch(breed=..., enclosure=...)
+    async def batch(self, **lookups):
+        results = await asyncio.gather(*lookups.values())
+        return dict(zip(lookups, results))
+
+    async def gather(self, *coros):
+        return list(await asyncio.gather(*coros))
+
+    #animal with its breed, enclosure and keepers, the three lookups in parallel
+    async def resolve_animal(self, animal_id):
+        animal = await self.get_animal_by_id(animal_id)
+        if animal is None:
+            return None
+        resolved = await self.batch(
+            breed=self.get_animalbreed_by_id(animal.animalbreed_id),
+            enclosure=self.get_enclosure_by_id(animal.enclosure_id),
+            keepers=self.view_keepers_by_enclosure(animal.enclosure_id),
+        )
+        resolved.update(animal_id=animal_id, name=animal.name, birthday=animal.birthday)
+        return resolved
+
+    async def _view(self, name, label):
+        try:
+            return await self._run(name, fetch='all')
+        except psycopg2.Error as e:
+            logging.error(e)
+            print(f"Error occurred while retrieving {label}.")
+            return []
+
+    async def _add(self, name, params, label):
+        try:
+            new_id = (await self._run(name, params, fetch='one'))[0]
+            print(f"{label} with ID {new_id} added successfully.")
+            return new_id
+        except psycopg2.Error as e:
+            logging.error(e)
+            print(f"Error occurred while adding {label.lower()}.")
+
+    async def _change(self, name, params, key, label, done, doing):
+        try:
+            await self._run(name, params)
+            print(f"{label} with ID {key} {done} successfully.")
+        except psycopg2.Error as e:
+            logging.error(e)
+            print(f"Error occurred while {doing} {label.lower()}.")
+
+    #the row, None when it does not exist
+    async def _get(self, name, key, label):
+        try:
+            return await self._run(name, (key,), fetch='one')
+        except psycopg2.Error as e:
+            logging.error(e)
+            print(f"Error occurred while retrieving {label}.")
+            return None
+
+    #CRUD enclosure
+    async def view_all_enclosures(self):
+        return await self._view("view_all_enclosures", "enclosures")
+
+    async def add_enclosure(self, name, size):
+        return await self._add("add_enclosure", (name, size), "Enclosure")
+
+    async def edit_enclosure(self, enclosure_id, name, size):
+        await self._change("edit_enclosure", (name, size, enclosure_id), enclosure_id, "Enclosure", "updated", "editing")
+
+    async def delete_enclosure(self, enclosure_id):
+        await self._change("delete_enclosure", (enclosure_id,), enclosure_id, "Enclosure", "deleted", "deleting")
+
+    async def get_enclosure_by_id(self, enclosure_id):
+        return await self._get("get_enclosure_by_id", enclosure_id, "enclosure")
+
+    #CRUD cat
+    async def view_all_animalcats(self):
+        return await self._view("view_all_animalcats", "animal categorys")
+
+    async def add_animalcat(self, category):
+        return await self._add("add_animalcat", (category,), "Animal category")
+
+    async def edit_animalcat(self, animalcat_id, category):
+        await self._change("edit_animalcat", (category, animalcat_id), animalcat_id, "Animal category", "updated", "editing")
+
+    async def delete_animalcat(self, animalcat_id):
+        await self._change("delete_animalcat", (animalcat_id,), animalcat_id, "Animal category", "deleted", "deleting")
+
+    async def get_animalcat_by_id(self, animalcat_id):
+        return await self._get("get_animalcat_by_id", animalcat_id, "animal category")
+
+    #CRUD breed
+    async def view_all_animalbreed(self):
+        return await self._view("view_all_animalbreed", "animal breeds")
+
+    async def add_animalbreed(self, breed, animalcat_id):
+        return await self._add("add_animalbreed", (breed, animalcat_id), "Animal breed")
+
+    async def edit_animalbreed(self, animalbreed_id, breed, animalcat_id):
+        await self._change("edit_animalbreed", (breed, animalcat_id, animalbreed_id), animalbreed_id, "Animal breed", "updated", "editing")
+
+    async def delete_animalbreed(self, animalbreed_id):
+        await self._change("delete_animalbreed", (animalbreed_id,), animalbreed_id, "Animal breed", "deleted", "deleting")
+
+    async def get_animalbreed_by_id(self, animalbreed_id):
+        return await self._get("get_animalbreed_by_id", animalbreed_id, "animal breed")
+
+    #CRUD keeper
+    async def view_all_keepers(self):
+        return await self._view("view_all_keepers", "keepers")
+
+    async def add_keeper(self, name, enclosure_id):
+        return await self._add("add_keeper", (name, enclosure_id), "Keeper")
+
+    async def edit_keeper(self, keeper_id, name, enclosure_id):
+        await self._change("edit_keeper", (name, enclosure_id, keeper_id), keeper_id, "Keeper", "updated", "editing")
+
+    async def delete_keeper(self, keeper_id):
+        await self._change("delete_keeper", (keeper_id,), keeper_id, "Keeper", "deleted", "deleting")
+
+    async def get_keeper_by_id(self, keeper_id):
+        return await self._get("get_keeper_by_id", keeper_id, "keeper")
+
+    async def view_keepers_by_enclosure(self, enclosure_id):
+        try:
+            return await self._run("view_keepers_by_enclosure", (enclosure_id,), fetch='all')
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while retrieving keepers.")
+            return []
+
+    #CRUD animal
+    async def view_all_animals(self):
+        return await self._view("view_all_animals", "animals")
+
+    async def add_animal(self, name, birthday, breed_id, enclosure_id):
+        return await self._add("add_animal", (name, birthday, breed_id, enclosure_id), "Animal")
+
+    async def edit_animal(self, animal_id, name, birthday, breed_id, enclosure_id):
+        await self._change("edit_animal", (name, birthday, breed_id, enclosure_id, animal_id), animal_id, "Animal", "updated", "editing")
+
+    async def delete_animal(self, animal_id):
+        await self._change("delete_animal", (animal_id,), animal_id, "Animal", "deleted", "deleting")
+
+    async def get_animal_by_id(self, animal_id):
+        return await self._get("get_animal_by_id", animal_id, "animal")
+
+    #overview, refreshed in one round trip when a write changed the tables
+    #(skipped while another client is refreshing it)
+    async def view_animal_overview(self):
+        conn = await self.pool.acquire()
+        cancelled = False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT zoo_refresh_overview(false)")
+            await wait(conn)
+        except psycopg2.Error as e:
+            logging.error(e)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            self.pool.release(conn, close=cancelled)
+        return await self._view("view_animal_overview", "the animal overview")
+
+    #search and filter
+    async def search_animal_name(self, name, limit=None, offset=0):
+        pattern = '%' + name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        try:
+            try:
+                return await self._run("search_animal_name", (pattern, name, limit, offset), fetch='all')
+            except psycopg2.errors.UndefinedFunction:
+                # no pg_trgm, order by id instead of similarity
+                return await self._run("search_animal_name_plain", (pattern, limit, offset), fetch='all')
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while searching animals by name.")
+            return []
+
+    async def filter_breeds_by_category(self, category):
+        try:
+            breeds = await self._run("filter_breeds_by_category", (category,), fetch='all')
+            return [breed[0] for breed in breeds]
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while filtering breeds by category.")
+            return []
+
+    async def filter_breeds_by_categories(self, categories):
+        if isinstance(categories, str):
+            categories = [categories]
+        try:
+            return await self._run("filter_breeds_by_categories", (list(categories),), fetch='all')
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while filtering breeds by category.")
+            return []
@@ -0,0 +1,19 @@
+import importlib
+from zoo.config import ConfigReader
+
+# [backend] engine= -> (module, DAO class); each class has the zooApp methods
+BACKENDS = {
+    'postgresql': ('zoo.zooApp', 'zooApp'),
+    'sqlite': ('zoo.zooSqlite', 'SqliteZooApp'),
+}
+
+
+#the DAO for the configured engine, postgresql without a [backend] section;
+#only the chosen module is imported
+def open_dao(configfile, section):
+    reader = ConfigReader(configfile, section)
+    engine = reader.config('backend').get('engine', 'postgresql') if reader.has_section('backend') else 'postgresql'
+    if engine not in BACKENDS:
+        raise ValueError(f"unknown backend engine {engine!r}, expected one of {', '.join(BACKENDS)}")
+    module, name = BACKENDS[engine]
+    return getattr(importlib.import_module(module), name)(configfile, section)
@@ -0,0 +1,162 @@
+import json
+import logging
+import psycopg2
+
+# per table: the fields of add/edit in statement order, and the name of
+# its view_all_* statement (for list)
+FIELDS = {
+    'enclosure': (['name', 'size'], 'view_all_enclosures'),
+    'animalcat': (['category'], 'view_all_animalcats'),
+    'animalbreed': (['breed', 'animalcat_id'], 'view_all_animalbreed'),
+    'keeper': (['name', 'enclosure_id'], 'view_all_keepers'),
+    'animal': (['name', 'birthday', 'animalbreed_id', 'enclosure_id'], 'view_all_animals'),
+}
+
+OPS = ('add', 'edit', 'delete', 'list', 'search')
+
+
+class BatchError(ValueError):
+    pass
+
+
+#one command per JSON line, blank lines and # comments are skipped
+def read_commands(f):
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            command = json.loads(line)
+        except ValueError as e:
+            raise BatchError(f"line {number}: {e}")
+        if not isinstance(command, dict):
+            raise BatchError(f"line {number}: expected a JSON object")
+        yield number, command
+
+
+def _table(command):
+    table = command.get('table')
+    if table not in FIELDS:
+        raise BatchError(f"unknown table {table!r}, expected one of {', '.join(FIELDS)}")
+    return table
+
+
+#primary keys are integers, so "1" evicts the same cache entry as 1
+def _key(command):
+    key = _values(command, ['id'])[0]
+    try:
+        if isinstance(key, bool):
+            raise ValueError
+        return int(key)
+    except (TypeError, ValueError):
+        raise BatchError(f"id must be an integer, got {key!r}")
+
+
+def _values(command, fields):
+    missing = [field for field in fields if field not in command]
+    if missing:
+        raise BatchError(f"missing {', '.join(missing)}")
+    return tuple(command[field] for field in fields)
+
+
+#UPDATE of only the fields the command has; the column names come from
+#FIELDS, never from the command
+def _edit(table, fields, command):
+    key = _key(command)
+    unknown = [field for field in command if field not in fields and field not in ('op', 'table', 'id')]
+    if unknown:
+        raise BatchError(f"unknown {table} field(s) {', '.join(unknown)}, expected some of {', '.join(fields)}")
+    given = [field for field in fields if field in command]
+    if not given:
+        raise BatchError(f"nothing to edit, expected some of {', '.join(fields)}")
+    sets = ', '.join(f"{field} = %s" for field in given)
+    return f"UPDATE {table} SET {sets} WHERE {table}_id = %s", tuple(command[field] for field in given) + (key,)
+
+
+class ZooBatch:
+
+    #runs add/edit/delete/list/search commands on one connection in one
+    #transaction (dao.transaction, so [transaction] flush_every applies; with
+    #keep_going it flushes between commands, never inside their savepoint)
+    #and yields one result dict per command, or per row for list/search.
+    #Not through the DAO's add_*/edit_*/delete_*: those print to stdout and
+    #swallow errors, here errors end the command (or the batch) and the
+    #output is JSON; edits and deletes evict the cache like the DAO does
+    def __init__(self, dao, keep_going=False):
+        self.dao = dao
+        self.keep_going = keep_going
+        self.commands = 0
+        self.failed = 0
+
+    def run(self, commands):
+        with self.dao.transaction():
+            for number, command in commands:
+                self.commands += 1
+                try:
+                    if self.keep_going:
+                        # a failing command only undoes itself
+                        with self.dao.savepoint():
+                            results = list(self._run(number, command))
+                        self.dao.flush()
+                    else:
+                        results = self._run(number, command)
+                    yield from results
+                except (psycopg2.Error, BatchError) as e:
+                    yield self._failed(number, command, e)
+                    if not self.keep_going:
+                        raise
+
+    def _failed(self, number, command, error):
+        logging.error(f"batch command {number} failed: {error}")
+        self.failed += 1
+        return {'n': number, 'op': command.get('op'), 'ok': False, 'error': str(error).strip()}
+
+    def _run(self, number, command):
+        op = command.get('op')
+        if op not in OPS:
+            raise BatchError(f"unknown op {op!r}, expected one of {', '.join(OPS)}")
+        if op == 'search':
+            yield from self._rows(number, op, *self._search(command))
+            return
+        table = _table(command)
+        fields, view = FIELDS[table]
+        if op == 'list':
+            yield from self._rows(number, op, self.dao.statements.sql(view), None)
+            return
+        with self.dao.cursor() as cur:
+            if op == 'add':
+                self.dao.execute(cur, f"add_{table}", _values(command, fields))
+                result = {'id': cur.fetchone()[0]}
+            elif op == 'edit':
+                cur.execute(*_edit(table, fields, command))
+                result = {'rows': cur.rowcount}
+            else:
+                self.dao.execute(cur, f"delete_{table}", (_key(command),))
+                result = {'rows': cur.rowcount}
+            self.dao.commit(cur)
+        if op != 'add':
+            self.dao.evict(table, _key(command), cascade=op == 'delete')
+        yield dict({'n': number, 'op': op, 'table': table, 'ok': True}, **result)
+
+    def _search(self, command):
+        name = _values(command, ['name'])[0]
+        pattern = '%' + name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        limit, offset = command.get('limit'), command.get('offset', 0)
+        if self.dao.trigram_available():
+            return self.dao.statements.sql("search_animal_name"), (pattern, name, limit, offset)
+        return self.dao.statements.sql("search_animal_name_plain"), (pattern, limit, offset)
+
+    #rows come from a server side cursor, so list works on any table size
+    def _rows(self, number, op, sql, params):
+        with self.dao.cursor(f"zoo_batch_{number}") as cur:
+            cur.itersize = self.dao.batch_size
+            cur.execute(sql, params)
+            columns = None
+            for row in cur:
+                # a named cursor only has a description after the first fetch
+                columns = columns or [column.name for column in cur.description]
+                yield {'n': number, 'op': op, 'row': dict(zip(columns, row))}
+
+
+def dumps(result):
+    return json.dumps(result, default=str)
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import os
+
+# load order, so names created by one file resolve in the next
+TABLE_ORDER = ['enclosure', 'animalcat', 'animalbreed', 'keeper', 'animal']
+
+# per table: plain columns with their cast, and foreign keys given either
+# by id (id column) or by name (name column looked up in the parent table)
+TABLES = {
+    'enclosure': {
+        'columns': [('name', None), ('size', 'int')],
+        'fks': [],
+    },
+    'animalcat': {
+        'columns': [('category', None)],
+        'fks': [],
+    },
+    'animalbreed': {
+        'columns': [('breed', None)],
+        'fks': [('animalcat_id', 'category', 'animalcat', 'category')],
+    },
+    'keeper': {
+        'columns': [('name', None)],
+        'fks': [('enclosure_id', 'enclosure', 'enclosure', 'name')],
+    },
+    'animal': {
+        'columns': [('name', None), ('birthday', 'date')],
+        'fks': [('animalbreed_id', 'breed', 'animalbreed', 'breed'),
+                ('enclosure_id', 'enclosure', 'enclosure', 'name')],
+    },
+}
+
+
+def stage_columns(table):
+    spec = TABLES[table]
+    cols = [col for col, _ in spec['columns']]
+    for id_col, name_col, _, _ in spec['fks']:
+        cols += [id_col, name_col]
+    return cols
+
+
+def _insert_sql(table, stage):
+    spec = TABLES[table]
+    targets, values, joins, unresolved = [], [], [], []
+    for col, cast in spec['columns']:
+        targets.append(col)
+        values.append(f"NULLIF(s.{col}, '')::{cast}" if cast else f"s.{col}")
+    for n, (id_col, name_col, parent, parent_col) in enumerate(spec['fks']):
+        # duplicate names resolve to the lowest id
+        joins.append(
+            f"LEFT JOIN (SELECT DISTINCT ON ({parent_col}) {parent_col} AS key, {id_col} AS id "
+            f"FROM {parent} ORDER BY {parent_col}, {id_col}) f{n} ON f{n}.key = s.{name_col}")
+        targets.append(id_col)
+        values.append(f"COALESCE(NULLIF(s.{id_col}, '')::int, f{n}.id)")
+        unresolved.append(f"(NULLIF(s.{id_col}, '') IS NULL AND s.{name_col} IS NOT NULL AND f{n}.id IS NULL)")
+    from_sql = f"FROM {stage} s " + " ".join(joins)
+    insert = f"INSERT INTO {table} ({', '.join(targets)}) SELECT {', '.join(values)} {from_sql}"
+    if unresolved:
+        insert += " WHERE NOT (" + " OR ".join(unresolved) + ")"
+        count = f"SELECT count(*) {from_sql} WHERE " + " OR ".join(unresolved)
+    else:
+        count = None
+    return insert, count
+
+
+class _RowReader:
+
+    #file like object for copy_expert, renders rows to csv on demand
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._pending = ''
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out, lineterminator='\n')
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = 1 << 16
+        self._out.seek(0)
+        self._out.truncate()
+        self._out.write(self._pending)
+        while self._out.tell() < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+        data = self._out.getvalue()
+        self._pending = data[size:]
+        return data[:size]
+
+
+def _jsonl_rows(f, columns):
+    for line in f:
+        if line.strip():
+            obj = json.loads(line)
+            yield [obj.get(col) for col in columns]
+
+
+class ZooBulkLoader:
+
+    def __init__(self, dao):
+        self.dao = dao
+
+    def _copy_file(self, cur, table, stage, path):
+        columns = stage_columns(table)
+        fmt = os.path.splitext(path)[1].lower()
+        with open(path, newline='', encoding='utf-8') as f:
+            if fmt == '.csv':
+                header = next(csv.reader([f.readline()]), [])
+                header = [col.strip() for col in header]
+                unknown = [col for col in header if col not in columns]
+                if unknown:
+                    raise ValueError(f"{path}: unknown columns for {table}: {', '.join(unknown)}")
+                cur.copy_expert(f"COPY {stage} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)", f)
+            elif fmt in ('.jsonl', '.ndjson'):
+                reader = _RowReader(_jsonl_rows(f, columns))
+                cur.copy_expert(f"COPY {stage} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", reader)
+            else:
+                raise ValueError(f"{path}: expected a .csv or .jsonl file")
+
+    def _load(self, cur, table, path):
+        stage = f"zoo_stage_{table}"
+        columns = ", ".join(f"{col} text" for col in stage_columns(table))
+        # a second load of the table in the same transaction reuses it
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} ({columns}) ON COMMIT DROP")
+        cur.execute(f"TRUNCATE {stage}")
+        self._copy_file(cur, table, stage, path)
+        insert, count = _insert_sql(table, stage)
+        skipped = 0
+        if count is not None:
+            cur.execute(count)
+            skipped = cur.fetchone()[0]
+        cur.execute(insert)
+        return cur.rowcount, skipped
+
+    #one file into one table, returns (inserted, skipped)
+    def load(self, table, path):
+        return self.load_many({table: path})[table]
+
+    #several files in one transaction, parents before children
+    def load_many(self, files):
+        unknown = [table for table in files if table not in TABLES]
+        if unknown:
+            raise ValueError(f"unknown tables: {', '.join(unknown)}")
+        results = {}
+        with self.dao.cursor() as cur:
+            for table in sorted(files, key=TABLE_ORDER.index):
+                results[table] = self._load(cur, table, files[table])
+            self.dao.commit(cur)
+        return results
@@ -0,0 +1,144 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# deleting a parent row cascades in the database, so evict children too:
+# (child namespace, field of the cached row holding the parent id)
+# None evicts the whole child namespace (animals only reach a category via
+# their breed, which might not be cached)
+CASCADE = {
+    'enclosure': [('keeper', 'enclosure_id'), ('animal', 'enclosure_id')],
+    'animalcat': [('animalbreed', 'animalcat_id'), ('animal', None)],
+    'animalbreed': [('animal', 'animalbreed_id')],
+}
+
+DEFAULT_TTL = {
+    'enclosure': 300.0,
+    'animalcat': 300.0,
+    'animalbreed': 300.0,
+    'keeper': 60.0,
+    'animal': 30.0,
+}
+
+
+class ZooCache:
+
+    #LRU over all namespaces, entries expire after their namespace ttl
+    def __init__(self, maxsize=10000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = dict(DEFAULT_TTL)
+        self.ttl.update(ttl or {})
+        self._data = OrderedDict()   # (namespace, key) -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        # bumped by every invalidation: a row read before one may be stale
+        self.generation = 0
+
+    @classmethod
+    def from_config(cls, options):
+        ttl = {name[4:]: float(value) for name, value in options.items() if name.startswith('ttl_')}
+        return cls(maxsize=int(options.get('maxsize', 10000)), ttl=ttl)
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end((namespace, key))
+                self.hits[namespace] = self.hits.get(namespace, 0) + 1
+                return entry[1]
+            if entry is not None:
+                del self._data[(namespace, key)]
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return MISSING
+
+    #generation = self.generation from before the row was read, the put is
+    #dropped when something was invalidated meanwhile
+    def put(self, namespace, key, value, generation=None):
+        ttl = self.ttl.get(namespace, 60.0)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[(namespace, key)] = (time.monotonic() + ttl, value)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop((namespace, key), None)
+
+    #row deleted: drop it and everything the ON DELETE CASCADE took with it
+    def invalidate_cascade(self, namespace, key):
+        with self._lock:
+            self.generation += 1
+            self._evict_cascade(namespace, key)
+
+    def _evict_cascade(self, namespace, key):
+        self._data.pop((namespace, key), None)
+        for child, field in CASCADE.get(namespace, []):
+            if field is None:
+                doomed = [k for k in self._data if k[0] == child]
+            else:
+                doomed = [k for k, (_, value) in self._data.items()
+                          if k[0] == child and getattr(value, field) == key]
+            for child_key in doomed:
+                self._evict_cascade(child, child_key[1])
+
+    #cascade=True also clears the namespaces a delete there cascades to
+    def clear(self, namespace=None, cascade=False):
+        with self._lock:
+            self.generation += 1
+            if namespace is None:
+                self._data.clear()
+            else:
+                self._clear(namespace, cascade)
+
+    def _clear(self, namespace, cascade):
+        for k in [k for k in self._data if k[0] == namespace]:
+            del self._data[k]
+        if cascade:
+            for child, _ in CASCADE.get(namespace, []):
+                self._clear(child, True)
+
+    def stats(self):
+        with self._lock:
+            names = sorted(set(self.hits) | set(self.misses))
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'evictions': self.evictions,
+                'namespaces': {
+                    name: {'hits': self.hits.get(name, 0), 'misses': self.misses.get(name, 0)}
+                    for name in names
+                },
+            }
+
+
+#read-through for zooApp.get_*_by_id, misses and errors are not cached;
+#inside transaction() the cache is bypassed, the connection sees rows that
+#are not committed yet and may never be; a miss is read from the primary
+def cached(namespace):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, key):
+            if self.cache is None or self._tx() is not None:
+                return method(self, key)
+            value = self.cache.get(namespace, key)
+            if value is MISSING:
+                generation = self.cache.generation
+                with self.primary_reads():
+                    value = method(self, key)
+                if value is not None:
+                    self.cache.put(namespace, key, value, generation)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,179 @@
+import contextlib
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+import sys
+from zoo.zooRows import projection
+
+# what can be exported: table (or the overview view) -> registry statement
+EXPORTS = {
+    'enclosure': 'view_all_enclosures',
+    'animalcat': 'view_all_animalcats',
+    'animalbreed': 'view_all_animalbreed',
+    'keeper': 'view_all_keepers',
+    'animal': 'view_all_animals',
+    'animal_overview': 'view_animal_overview',
+}
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+COMPRESSIONS = ('gzip', 'zstd')
+
+# postgres type oid -> arrow type name, anything else is exported as string
+ARROW_TYPES = {16: 'bool_', 20: 'int64', 21: 'int16', 23: 'int32', 700: 'float32', 701: 'float64',
+               1082: 'date32'}
+
+
+#format and compression from the file name when not given:
+#animals.jsonl.gz -> (jsonl, gzip)
+def guess(path, fmt=None, compression=None):
+    name = path.lower()
+    if compression is None:
+        if name.endswith('.gz'):
+            compression, name = 'gzip', name[:-3]
+        elif name.endswith('.zst'):
+            compression, name = 'zstd', name[:-4]
+    if fmt is None:
+        fmt = os.path.splitext(name)[1].lstrip('.') or 'csv'
+        fmt = 'jsonl' if fmt == 'ndjson' else fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    if compression not in (None, 'none') + COMPRESSIONS:
+        raise ValueError(f"unknown compression {compression!r}, expected one of {', '.join(COMPRESSIONS)}")
+    return fmt, None if compression == 'none' else compression
+
+
+#binary file object for path ('-' = stdout), compressed while writing
+@contextlib.contextmanager
+def _open(path, compression):
+    with contextlib.ExitStack() as stack:
+        if path == '-':
+            raw = sys.stdout.buffer
+        else:
+            raw = stack.enter_context(open(path, 'wb'))
+        if compression == 'gzip':
+            yield stack.enter_context(gzip.GzipFile(fileobj=raw, mode='wb'))
+        elif compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compression needs the zstandard package")
+            yield stack.enter_context(zstandard.ZstdCompressor().stream_writer(raw, closefd=False))
+        else:
+            yield raw
+
+
+def _arrow_type(pyarrow, oid):
+    if oid == 1114:
+        return pyarrow.timestamp('us')
+    return getattr(pyarrow, ARROW_TYPES.get(oid, 'string'))()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ZooExporter:
+
+    #csv goes through COPY ... TO STDOUT, jsonl and parquet read a server
+    #side cursor in batch_size batches; neither keeps more than one batch
+    def __init__(self, dao, batch_size=None):
+        self.dao = dao
+        self.batch_size = batch_size or dao.batch_size
+
+    #writes table (or only its columns) to path, returns the number of rows
+    def export(self, table, path, fmt=None, compression=None, columns=None):
+        if table not in EXPORTS:
+            raise ValueError(f"unknown table {table!r}, expected one of {', '.join(EXPORTS)}")
+        fmt, compression = guess(path, fmt, compression)
+        if table == 'animal_overview' and self.dao.overview_refresh == 'lazy':
+            self.dao.refresh_overview()
+        if columns:
+            sql = projection(table, columns)[0]
+        else:
+            sql = self.dao.statements.sql(EXPORTS[table])
+        if fmt == 'parquet':
+            # parquet compresses its row groups itself
+            return self._parquet(sql, path, compression)
+        with _open(path, compression) as f:
+            if fmt == 'csv':
+                return self._csv(sql, f)
+            return self._jsonl(sql, f)
+
+    def _csv(self, sql, f):
+        if self.dao.backend != 'postgresql':
+            return self._csv_rows(sql, f)
+        with self.dao.read_cursor() as cur:
+            cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+            rows = cur.rowcount
+            self.dao.commit(cur, wrote=False)
+        return rows
+
+    #csv without COPY, from the same batches as jsonl
+    def _csv_rows(self, sql, f):
+        count = 0
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='', write_through=True)
+        writer = csv.writer(text)
+        for description, rows in self._batches(sql, "zoo_export_csv"):
+            if count == 0:
+                writer.writerow([column.name for column in description])
+            writer.writerows(rows)
+            count += len(rows)
+        text.detach()
+        return count
+
+    #the first batch comes even when empty, for the column names and types
+    def _batches(self, sql, name):
+        with self.dao.read_cursor(name) as cur:
+            cur.itersize = self.batch_size
+            cur.execute(sql)
+            first = True
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if rows or first:
+                    yield cur.description, rows
+                if not rows:
+                    break
+                first = False
+
+    def _jsonl(self, sql, f):
+        count, columns = 0, None
+        for description, rows in self._batches(sql, "zoo_export_jsonl"):
+            columns = columns or [column.name for column in description]
+            f.write(''.join(json.dumps(dict(zip(columns, row)), default=_json_default) + '\n'
+                            for row in rows).encode('utf-8'))
+            count += len(rows)
+        return count
+
+    #one row group per batch, the schema comes from the column types
+    def _parquet(self, sql, path, compression):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("parquet export needs the pyarrow package")
+        if path == '-':
+            raise ValueError("parquet cannot be written to stdout")
+        count, writer = 0, None
+        try:
+            for description, rows in self._batches(sql, "zoo_export_parquet"):
+                if writer is None:
+                    schema = pyarrow.schema([(column.name, _arrow_type(pyarrow, column.type_code))
+                                             for column in description])
+                    writer = pyarrow.parquet.ParquetWriter(path, schema, compression=compression or 'snappy')
+                columns = list(zip(*rows)) or [[] for _ in schema]
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema))
+                count += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+        return count
@@ -1,14 +1,61 @@
-from rich.console import Console
-from zoo.zooApp import zooApp
-from rich.table import Table
+import itertools
+import threading
+from zoo.zooBackends import open_dao
+from zoo.zooStats import ZooStats
+
+
+# rich is the slowest import of the app, it is only loaded when the first
+# thing is printed (meanwhile the database connects in the background)
+class _LazyConsole:
+
+    def __getattr__(self, name):
+        global console
+        from rich.console import Console
+        console = Console()
+        return getattr(console, name)
+
+
+console = _LazyConsole()
+
+# search_index kinds as the menus call them
+SEARCH_KINDS = {
+    'animal': "Animal",
+    'animalbreed': "Breed",
+    'animalcat': "Category",
+    'keeper': "Keeper",
+    'enclosure': "Enclosure",
+}
+
+
+def new_table():
+    from rich.table import Table
+    return Table(show_header=True, header_style="bold magenta")
 
-console = Console()
 
 class ZooInput:
     def __init__(self, configfile, section):
-        self.dao = zooApp(configfile, section)
-        self.dao.connect()
-        self.dao.create_tables()
+        self._dao = open_dao(configfile, section)
+        self._error = None
+        # connect and check the schema while the menu draws,
+        # the first use of self.dao waits for it
+        self._connecting = threading.Thread(target=self._connect, daemon=True)
+        self._connecting.start()
+
+    def _connect(self):
+        try:
+            self._dao.connect()
+            self._dao.create_tables()
+        except Exception as e:
+            self._error = e
+
+    @property
+    def dao(self):
+        if self._connecting is not None:
+            self._connecting.join()
+            self._connecting = None
+            if self._error is not None:
+                raise self._error
+        return self._dao
     
      
     def __repr__(self):
@@ -52,52 +99,122 @@ class ZooInput:
         console.print("5. View all animals")
         console.print("6. Search for animal by ID")
         console.print("7. Filter animal breeds by their categories")
+        console.print("8. Show query statistics")
+        console.print("9. Show zoo statistics")
+        console.print("10. Search the whole zoo")
         console.print("0. Exit")
         console.print("Enter your choice:")
 
 
-    #enclosures
-    def display_enclosures(self):
-        enclosures = self.dao.view_all_enclosures()
-
-        if len(enclosures) == 0:
-            console.print("No enclosures found.")
+    # all rows of a stream_* iterator: the header and the first rows are
+    # printed right away, then chunk after chunk as they arrive, above a
+    # live row count. Column widths come from the first sample rows and
+    # stay fixed so every chunk lines up: number columns get two more
+    # digits (ids keep growing), longer text is cut off at max_width
+    def stream_table(self, rows, columns, row, empty, sample=100, chunk=500, max_width=40):
+        from rich import box
+        from rich.live import Live
+        source = iter(rows)
+        rows = (row(record) for record in source)
+        first = list(itertools.islice(rows, sample))
+        if len(first) == 0:
+            console.print(empty)
             return
+        widths = []
+        for column, column_cells in zip(columns, zip(*first)):
+            width = max(len(cell or "") for cell in column_cells)
+            if all((cell or "").isdigit() for cell in column_cells):
+                width += 2
+            widths.append(max(len(column), min(width, max_width)))
+
+        def chunk_table(cells, header):
+            table = new_table()
+            table.box, table.show_edge, table.show_header = box.SIMPLE_HEAD, False, header
+            for column, width in zip(columns, widths):
+                table.add_column(column, width=width, no_wrap=True, overflow="ellipsis")
+            for record in cells:
+                table.add_row(*record)
+            return table
+
+        count = 0
+        try:
+            with Live(console=console, transient=True) as live:
+                cells = first
+                while cells:
+                    live.console.print(chunk_table(cells, count == 0))
+                    count += len(cells)
+                    live.update(f"{count} rows so far, Ctrl+C stops")
+                    cells = list(itertools.islice(rows, chunk))
+        except KeyboardInterrupt:
+            console.print("(stopped)")
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+        console.print(f"{count} rows")
+
+    # one page at a time, n/p move with the page tokens so a page costs
+    # the same however far into the table it is; a streams every row
+    def page_table(self, fetch, columns, row, empty, stream=None):
+        token = None
+        while True:
+            page = fetch(token)
+
+            if len(page.rows) == 0:
+                console.print(empty)
+                return
+
+            table = new_table()
+            for column in columns:
+                table.add_column(column)
+
+            for record in page.rows:
+                table.add_row(*row(record))
+
+            console.print(table)
+            options = []
+            if page.next:
+                options.append("n = next page")
+            if page.previous:
+                options.append("p = previous page")
+            if not options:
+                return
+            if stream is not None:
+                options.append("a = all rows")
+            answer = input(", ".join(options + ["Enter = continue"]) + ": ").strip().lower()
+            if answer == "n" and page.next:
+                token = page.next
+            elif answer == "p" and page.previous:
+                token = page.previous
+            elif answer == "a" and stream is not None:
+                self.stream_table(stream(), columns, row, empty)
+                return
+            else:
+                return
 
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("ID")
-        table.add_column("Name")
-        table.add_column("Size")
-
-        for enclosure in enclosures:
-            table.add_row(str(enclosure[0]), enclosure[1], str(enclosure[2]))
 
-        console.print(table)
+    #enclosures
+    def display_enclosures(self):
+        self.page_table(self.dao.page_enclosures, ["ID", "Name", "Size"],
+                        lambda enclosure: (str(enclosure.enclosure_id), enclosure.name, str(enclosure.size)),
+                        "No enclosures found.",
+                        self.dao.stream_all_enclosures)
 
     def display_menu_enclosures(self):
         console.print("[bold magenta]Menu:  Enclosure:[/bold magenta]")
         console.print("1. Create new enclosure")
         console.print("2. Edit enclosure")
         console.print("3. Delete enclosure")
+        console.print("4. Move all animals to another enclosure")
+        console.print("5. Reassign all keepers to another enclosure")
         console.print("0. Back to main menu")
         console.print("Enter your choice:")
 
     #animalcat
     def display_animalcats(self):
-        animalcats = self.dao.view_all_animalcats()
-
-        if len(animalcats) == 0:
-            console.print("No animalcats found.")
-            return
-
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("ID")
-        table.add_column("category")
-
-        for animalcat in animalcats:
-            table.add_row(str(animalcat[0]), animalcat[1])
-
-        console.print(table)
+        self.page_table(self.dao.page_animalcats, ["ID", "category"],
+                        lambda animalcat: (str(animalcat.animalcat_id), animalcat.category),
+                        "No animalcats found.",
+                        self.dao.stream_all_animalcats)
 
 
     def display_menu_animalcats(self):
@@ -105,26 +222,16 @@ class ZooInput:
         console.print("1. Create new categorie")
         console.print("2. Edit categorie")
         console.print("3. Delete categorie")
+        console.print("4. Move all breeds to another categorie")
         console.print("0. Back to main menu")
         console.print("Enter your choice:")
 
     #breed
     def display_animalbreed(self):
-        animalbreed = self.dao.view_all_animalbreed()
-
-        if len(animalbreed) == 0:
-            console.print("No breeds found.")
-            return
-
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("ID")
-        table.add_column("Breed")
-        table.add_column("Animal cat ID")
-
-        for breed in animalbreed:
-            table.add_row(str(breed[0]), breed[1], str(breed[2]))
-
-        console.print(table)
+        self.page_table(self.dao.page_animalbreed, ["ID", "Breed", "Animal cat ID"],
+                        lambda breed: (str(breed.animalbreed_id), breed.breed, str(breed.animalcat_id)),
+                        "No breeds found.",
+                        self.dao.stream_all_animalbreed)
 
 
     def display_menu_animalbreed(self):
@@ -137,21 +244,10 @@ class ZooInput:
 
     #keeper
     def display_keepers(self):
-        keepers = self.dao.view_all_keepers()
-
-        if len(keepers) == 0:
-            console.print("No keepers found.")
-            return
-
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("ID")
-        table.add_column("Name")
-        table.add_column("Enclosure ID")
-
-        for keeper in keepers:
-            table.add_row(str(keeper[0]), keeper[1], str(keeper[2]))
-
-        console.print(table)
+        self.page_table(self.dao.page_keepers, ["ID", "Name", "Enclosure ID"],
+                        lambda keeper: (str(keeper.keeper_id), keeper.name, str(keeper.enclosure_id)),
+                        "No keepers found.",
+                        self.dao.stream_all_keepers)
 
 
     def display_menu_keepers(self):
@@ -164,23 +260,11 @@ class ZooInput:
 
     #animal
     def display_animals(self):
-        animals = self.dao.view_all_animals()
-
-        if len(animals) == 0:
-            console.print("No animals found.")
-            return
-
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("ID")
-        table.add_column("Name")
-        table.add_column("Birthday")
-        table.add_column("Breed ID")
-        table.add_column("Enclosure ID")
-
-        for animal in animals:
-            table.add_row(str(animal[0]), animal[1], str(animal[2]), str(animal[3]), str(animal[4]))
-
-        console.print(table)
+        self.page_table(self.dao.page_animal_overview,
+                        ["ID", "Name", "Birthday", "Breed", "Category", "Enclosure", "Keepers"],
+                        lambda animal: (str(animal.animal_id), animal.animal, str(animal.birthday), str(animal.breed),
+                                        str(animal.category), str(animal.enclosure), str(animal.keepers or "")),
+                        "No animals found.", self.dao.stream_animal_overview)
 
 
     def display_menu_animals(self):
@@ -188,62 +272,157 @@ class ZooInput:
         console.print("1. Create new animal")
         console.print("2. Edit animal")
         console.print("3. Delete animal")
+        console.print("4. Delete all animals of a breed")
         console.print("0. Back to main menu")
         console.print("Enter your choice:")
 
     #search
-    def handle_search(self):
-        console.print("Enter the Animal ID to search.")
+    # search over every name: animals, breeds, categories, keepers, enclosures
+    def handle_search_all(self, page_size=20):
+        console.print("Enter one or more words (or the start of them) to search for.")
         keyword = self.get_valid_input("Keyword: ", str)
-        results = self.dao.search_animal_name(keyword)
+        offset = 0
+        while True:
+            results = self.dao.search(keyword, limit=page_size + 1, offset=offset)
 
-        if len(results) == 0:
-            console.print("No matching animals found.")
-            return
+            if len(results) == 0:
+                console.print("Nothing found.")
+                return
 
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("ID")
-        table.add_column("Name")
-        table.add_column("Birthday")
-        table.add_column("Breed")
-        table.add_column("Enclosure")
+            table = new_table()
+            table.add_column("Type")
+            table.add_column("ID")
+            table.add_column("Name")
 
-        for result in results:
-            animal_id, name, birthday, breed, enclosure = result
-            table.add_row(str(animal_id), name, str(birthday), str(breed), str(enclosure))
+            for hit in results[:page_size]:
+                table.add_row(SEARCH_KINDS[hit.kind], str(hit.id), hit.label)
 
-        console.print(table)
+            console.print(table)
+            if len(results) <= page_size:
+                return
+            if input("n = next page, Enter = back: ").strip().lower() != "n":
+                return
+            offset += page_size
+
+    def handle_search(self, page_size=20):
+        console.print("Enter the animal name (or part of it) to search.")
+        keyword = self.get_valid_input("Keyword: ", str)
+        offset = 0
+        while True:
+            # one extra row tells us whether there is a next page
+            results = self.dao.search_animal_name(keyword, limit=page_size + 1, offset=offset)
+
+            if len(results) == 0:
+                console.print("No matching animals found.")
+                return
+
+            table = new_table()
+            table.add_column("ID")
+            table.add_column("Name")
+            table.add_column("Birthday")
+            table.add_column("Breed")
+            table.add_column("Enclosure")
+
+            for animal in results[:page_size]:
+                table.add_row(str(animal.animal_id), animal.name, str(animal.birthday),
+                              str(animal.animalbreed_id), str(animal.enclosure_id))
+
+            console.print(table)
+            if len(results) <= page_size:
+                return
+            if input("n = next page, Enter = back: ").strip().lower() != "n":
+                return
+            offset += page_size
 
 
     #filter
     def handle_filter(self):
-        console = Console()
-        console.print("Enter animal category name to filter by.")
-        category_name = input("Category Name: ")
-        breeds = self.dao.filter_breeds_by_category(category_name)
+        console.print("Enter animal category names to filter by (separate several with commas).")
+        category_names = [name.strip() for name in input("Category Name: ").split(",") if name.strip()]
+        breeds = self.dao.filter_breeds_by_categories(category_names)
 
         if len(breeds) == 0:
             console.print("No matching breeds found.")
             return
 
-        table = Table(show_header=True, header_style="bold magenta")
+        table = new_table()
         table.add_column("ID")
         table.add_column("Breed")
         table.add_column("Animal Category")
 
         for breed in breeds:
-            breed_id = str(breed[0])
-            breed_name = breed[1]
-            animal_category = self.dao.get_category_by_name(category_name)  # Assuming you have a method to get the category name
+            table.add_row(str(breed.animalbreed_id), breed.breed, breed.category)
 
-            table.add_row(breed_id, breed_name, animal_category)
+        console.print(table)
+
+
+    #zoo statistics
+    def display_stats(self):
+        stats = ZooStats(self.dao)
+        totals = stats.totals()
+        if not totals:
+            return
+        density = f"{totals['density']:.4f}" if totals['density'] is not None else "-"
+        console.print(f"{totals['enclosures']} enclosures, {totals['size']} m2, {totals['animals']} animals "
+                      f"({density} per m2), {totals['keepers']} keepers")
+
+        table = new_table()
+        table.add_column("ID")
+        table.add_column("Enclosure")
+        table.add_column("Size m2")
+        table.add_column("Animals")
+        table.add_column("Keepers")
+        table.add_column("Animals per m2")
+
+        for enclosure_id, name, size, animals, keepers, density in stats.enclosures():
+            table.add_row(str(enclosure_id), name, str(size), str(animals), str(keepers),
+                          str(density) if density is not None else "-")
 
         console.print(table)
 
+        table = new_table()
+        table.add_column("ID")
+        table.add_column("Category")
+        table.add_column("Breeds")
+        table.add_column("Animals")
+
+        for animalcat_id, category, breeds, animals in stats.categories():
+            table.add_row(str(animalcat_id), category, str(breeds), str(animals))
+
+        console.print(table)
+
+
+    #query statistics
+    def display_metrics(self, json_file='zoo/metrics.json'):
+        if self.dao.metrics is None:
+            console.print("Query statistics are disabled (add a [metrics] section to database.ini).")
+            return
+        snapshot = self.dao.metrics.snapshot()
+
+        table = new_table()
+        table.add_column("Statement")
+        table.add_column("Calls")
+        table.add_column("Rows")
+        table.add_column("Avg ms")
+        table.add_column("p95 ms")
+        table.add_column("Max ms")
+
+        for label, stats in snapshot['statements'].items():
+            table.add_row(label, str(stats['count']), str(stats['rows']), f"{stats['avg_ms']:.2f}",
+                          f"{stats['p95_ms']:.2f}", f"{stats['max_ms']:.2f}")
+
+        console.print(table)
+        wait = snapshot['pool_wait']
+        if wait['count']:
+            console.print(f"Pool wait: {wait['count']} checkouts, avg {wait['avg_ms']:.2f} ms, p95 {wait['p95_ms']:.2f} ms, max {wait['max_ms']:.2f} ms")
+        console.print(f"Slow queries (>= {snapshot['slow_ms']:.0f} ms): {snapshot['slow_queries']}")
+        with open(json_file, 'w') as f:
+            f.write(self.dao.metrics_json())
+        console.print(f"Written to {json_file}")
+
 
     #big menu
     def run(self):
-        print(self.dao)
         while True:
             self.display_menu()
             choice = self.get_user_choice()
@@ -267,6 +446,16 @@ class ZooInput:
                     enclosure_id = self.get_valid_input("Enter the ID of the enclosure to delete: ", int)
                     self.dao.delete_enclosure(enclosure_id)
                     
+                elif enclosure_choice == 4:
+                    from_id = self.get_valid_input("Enter the ID of the enclosure to move the animals from: ", int)
+                    to_id = self.get_valid_input("Enter the ID of the enclosure to move them to: ", int)
+                    self.dao.move_animals(from_id, to_id)
+                    
+                elif enclosure_choice == 5:
+                    from_id = self.get_valid_input("Enter the ID of the enclosure the keepers work in now: ", int)
+                    to_id = self.get_valid_input("Enter the ID of their new enclosure: ", int)
+                    self.dao.reassign_keepers(from_id, to_id)
+                    
                 elif enclosure_choice == 0:
                     continue
                     
@@ -290,6 +479,11 @@ class ZooInput:
                     animalcat_id = self.get_valid_input("Enter the ID of the category to delete: ", int)
                     self.dao.delete_animalcat(animalcat_id)
                     
+                elif animalcat_choice == 4:
+                    from_id = self.get_valid_input("Enter the ID of the category to move the breeds from: ", int)
+                    to_id = self.get_valid_input("Enter the ID of the category to move them to: ", int)
+                    self.dao.retag_breeds(from_id, to_id)
+                    
                 elif animalcat_choice == 0:
                     continue
                     
@@ -368,6 +562,10 @@ class ZooInput:
                     animal_id = self.get_valid_input("Enter the ID of the animal to delete: ", int)
                     self.dao.delete_animal(animal_id)
                     
+                elif animal_choice == 4:
+                    breed_id = self.get_valid_input("Enter the ID of the breed whose animals to delete: ", int)
+                    self.dao.delete_animals_by_breed(breed_id)
+                    
                 elif animal_choice == 0:
                     continue
                 else:
@@ -376,8 +574,17 @@ class ZooInput:
                 self.handle_search()
             elif choice == 7:
                 self.handle_filter()
+            elif choice == 8:
+                self.display_metrics()
+            elif choice == 9:
+                self.display_stats()
+            elif choice == 10:
+                self.handle_search_all()
             elif choice == 0:
+                if self.dao.pool is not None:
+                    console.print(self.dao)
                 console.print('🐊See you later alligator🐊')
+                self.dao.close()
                 break
             else:
                 console.print("...")
@@ -0,0 +1,179 @@
+import atexit
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+import psycopg2.extensions
+
+# upper bounds (ms) of the latency histogram buckets, the last one is open
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_EXECUTE = re.compile(r"\s*EXECUTE\s+zoo_(\w+)", re.IGNORECASE)
+
+# the slow query log of every ZooMetrics, each adds its file while it is open
+_slow_log = logging.getLogger('zoo.slowquery')
+_slow_log.propagate = False
+_slow_log.setLevel(logging.INFO)
+
+
+#stable name for a statement: the registry name for EXECUTE zoo_<name>,
+#otherwise the start of the SQL with whitespace collapsed
+def statement_label(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = str(sql)
+    match = _EXECUTE.match(sql)
+    if match:
+        return match.group(1)
+    return ' '.join(sql.split())[:80]
+
+
+class _Histogram:
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms, rows=0):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.rows += max(rows, 0)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    #upper bound of the bucket holding the q-th quantile
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': dict(zip([str(b) for b in BUCKETS_MS] + ['inf'], self.buckets)),
+        }
+
+
+class ZooMetrics:
+
+    #latency per statement, pool wait, and a slow query log (JSON lines)
+    #written by a QueueListener thread so the query path never does file I/O
+    def __init__(self, slow_ms=200.0, slow_log='zoo/slow_query.log'):
+        self.slow_ms = slow_ms
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._pool_wait = _Histogram()
+        self.slow_queries = 0
+        self._listener = None
+        self._handler = None
+        if slow_log:
+            # logging.handlers pulls in socket and pickle, keep it off the startup path
+            from logging.handlers import QueueHandler, QueueListener
+            from queue import SimpleQueue
+            log_queue = SimpleQueue()
+            file_handler = logging.FileHandler(slow_log, encoding='utf-8')
+            file_handler.setFormatter(logging.Formatter('%(message)s'))
+            self._handler = QueueHandler(log_queue)
+            _slow_log.addHandler(self._handler)
+            self._listener = QueueListener(log_queue, file_handler)
+            self._listener.start()
+            # records still queued are lost unless the listener is stopped,
+            # also when the program ends without dao.close()
+            atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, options):
+        return cls(slow_ms=float(options.get('slow_ms', 200)),
+                   slow_log=options.get('slow_log', 'zoo/slow_query.log') or None)
+
+    def record(self, sql, ms, rows):
+        label = statement_label(sql)
+        with self._lock:
+            stats = self._statements.get(label)
+            if stats is None:
+                stats = self._statements[label] = _Histogram()
+            stats.add(ms, rows)
+            slow = ms >= self.slow_ms
+            if slow:
+                self.slow_queries += 1
+        if slow and self._listener is not None:
+            _slow_log.info(json.dumps({
+                'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'statement': label,
+                'ms': round(ms, 3),
+                'rows': rows,
+                'sql': ' '.join(str(sql).split())[:500],
+            }))
+
+    def record_wait(self, ms):
+        with self._lock:
+            self._pool_wait.add(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'since': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'slow_ms': self.slow_ms,
+                'slow_queries': self.slow_queries,
+                'pool_wait': self._pool_wait.as_dict(),
+                'statements': {label: stats.as_dict() for label, stats in sorted(self._statements.items())},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+            self._pool_wait = _Histogram()
+            self.slow_queries = 0
+            self.started = time.time()
+
+    def close(self):
+        if self._listener is not None:
+            atexit.unregister(self.close)
+            _slow_log.removeHandler(self._handler)
+            self._listener.stop()
+            self._listener.handlers[0].close()
+            self._listener = self._handler = None
+
+
+#cursor class that reports every execute/copy to metrics, used as the
+#connection's cursor_factory so named cursors are covered as well
+def timed_cursor(metrics):
+
+    class TimedCursor(psycopg2.extensions.cursor):
+
+        def execute(self, sql, params=None):
+            start = time.perf_counter()
+            try:
+                return super().execute(sql, params)
+            finally:
+                metrics.record(sql, (time.perf_counter() - start) * 1000, self.rowcount)
+
+        def copy_expert(self, sql, file, size=8192):
+            start = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                metrics.record(sql, (time.perf_counter() - start) * 1000, self.rowcount)
+
+    return TimedCursor
@@ -0,0 +1,581 @@
+import json
+import logging
+import psycopg2
+import psycopg2.errors
+
+encolsuresql = """
+    CREATE TABLE IF NOT EXISTS enclosure(
+        enclosure_id               SERIAL PRIMARY KEY,
+        name                       VARCHAR(100),
+        size                       INT
+    )"""
+
+catsql = """
+    CREATE TABLE IF NOT EXISTS animalcat(
+        animalcat_id            SERIAL PRIMARY KEY,
+        category                  VARCHAR(100)
+    );"""
+
+breedsql = """
+    CREATE TABLE IF NOT EXISTS animalbreed(
+        animalbreed_id             SERIAL PRIMARY KEY,
+        breed                      VARCHAR(100),
+        animalcat_id               INTEGER REFERENCES animalcat(animalcat_id) ON DELETE CASCADE
+    );"""
+
+keepersql = """
+    CREATE TABLE IF NOT EXISTS keeper(
+        keeper_id                  SERIAL PRIMARY KEY,
+        name                       VARCHAR(100),
+        enclosure_id               INTEGER REFERENCES enclosure(enclosure_id ) ON DELETE CASCADE
+    );"""
+
+animalsql = """
+    CREATE TABLE IF NOT EXISTS animal(
+        animal_id                  SERIAL PRIMARY KEY,
+        name                       VARCHAR(100),
+        birthday                   date,
+        animalbreed_id            INTEGER REFERENCES animalbreed(animalbreed_id) ON DELETE CASCADE,
+        enclosure_id               INTEGER REFERENCES enclosure(enclosure_id ) ON DELETE CASCADE
+    );"""
+
+versionsql = """
+    CREATE TABLE IF NOT EXISTS schema_version(
+        version                    INTEGER PRIMARY KEY,
+        description                VARCHAR(200),
+        applied_at                 TIMESTAMP DEFAULT now()
+    );"""
+
+overviewsql = """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS animal_overview AS
+        SELECT animal.animal_id,
+               animal.name                 AS animal,
+               animal.birthday,
+               animalbreed.breed,
+               animalcat.category,
+               enclosure.name              AS enclosure,
+               string_agg(keeper.name, ', ' ORDER BY keeper.name) AS keepers
+        FROM animal
+        LEFT JOIN animalbreed ON animalbreed.animalbreed_id = animal.animalbreed_id
+        LEFT JOIN animalcat ON animalcat.animalcat_id = animalbreed.animalcat_id
+        LEFT JOIN enclosure ON enclosure.enclosure_id = animal.enclosure_id
+        LEFT JOIN keeper ON keeper.enclosure_id = animal.enclosure_id
+        GROUP BY animal.animal_id, animalbreed.breed, animalcat.category, enclosure.name
+    WITH DATA"""
+
+# one row flag, set by statement triggers on every write to the five tables
+overviewstatesql = """
+    CREATE TABLE IF NOT EXISTS overview_state(
+        id                         BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+        dirty                      BOOLEAN NOT NULL DEFAULT false
+    );"""
+
+overviewdirtysql = """
+    CREATE OR REPLACE FUNCTION mark_overview_dirty() RETURNS trigger AS $$
+    BEGIN
+        UPDATE overview_state SET dirty = true WHERE NOT dirty;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""
+
+ZOO_TABLES = ['enclosure', 'animalcat', 'animalbreed', 'keeper', 'animal']
+
+
+def _overview_triggers(when='AFTER'):
+    statements = []
+    for table in ZOO_TABLES:
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_overview_dirty ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {table}_overview_dirty {when} INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE PROCEDURE mark_overview_dirty()")
+    return statements
+
+
+# the dirty flag of migration 4 could be cleared by a refresh that missed a
+# write committing during it. Writes now bump version (holding the row lock
+# until they commit) and a refresh stores the version it read before, so a
+# write it did not see leaves version ahead of refreshed. The triggers fire
+# BEFORE the statement: every writer takes this lock before any row lock
+overviewversionsql = """
+    CREATE OR REPLACE FUNCTION mark_overview_dirty() RETURNS trigger AS $$
+    BEGIN
+        UPDATE overview_state SET version = version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""
+
+# true when it refreshed; the UPDATE waits for writers still holding the
+# row, and if they bumped version meanwhile the view stays dirty
+overviewrefreshsql = """
+    CREATE OR REPLACE FUNCTION zoo_refresh_overview(force BOOLEAN) RETURNS BOOLEAN AS $$
+    DECLARE
+        seen BIGINT;
+    BEGIN
+        SELECT version INTO seen FROM overview_state WHERE force OR version <> refreshed;
+        IF NOT FOUND THEN
+            RETURN false;
+        END IF;
+        REFRESH MATERIALIZED VIEW CONCURRENTLY animal_overview;
+        UPDATE overview_state SET refreshed = greatest(refreshed, seen);
+        RETURN true;
+    END
+    $$ LANGUAGE plpgsql"""
+
+
+# migration 8 made every writer queue on the one overview_state row. Now
+# each writing transaction inserts its own txid (AFTER the statement, no
+# shared row to wait for). A refresh deletes the committed ones and then
+# refreshes: its snapshot is newer than the DELETE's, so it sees every
+# write it cleared, and writes still in flight leave their row for the
+# next refresh. The advisory lock lets a concurrent reader skip the
+# refresh instead of queueing behind it
+overviewchangessql = """
+    CREATE TABLE IF NOT EXISTS overview_changes(
+        xid                        BIGINT PRIMARY KEY
+    );"""
+
+overviewchangesql = """
+    CREATE OR REPLACE FUNCTION mark_overview_dirty() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO overview_changes (xid) VALUES (txid_current()) ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""
+
+OVERVIEW_LOCK_ID = 153154
+
+overviewtryrefreshsql = f"""
+    CREATE OR REPLACE FUNCTION zoo_refresh_overview(force BOOLEAN) RETURNS BOOLEAN AS $$
+    BEGIN
+        IF NOT pg_try_advisory_xact_lock({OVERVIEW_LOCK_ID}) THEN
+            RETURN false;
+        END IF;
+        DELETE FROM overview_changes;
+        IF NOT FOUND AND NOT force THEN
+            RETURN false;
+        END IF;
+        REFRESH MATERIALIZED VIEW CONCURRENTLY animal_overview;
+        RETURN true;
+    END
+    $$ LANGUAGE plpgsql"""
+
+
+# per enclosure and per category counts for the statistics screen, kept
+# current by statement triggers that read the changed rows from transition
+# tables, so a bulk insert costs one grouped UPDATE and not one per row
+enclosurestatssql = """
+    CREATE TABLE IF NOT EXISTS enclosure_stats(
+        enclosure_id               INTEGER PRIMARY KEY REFERENCES enclosure(enclosure_id) ON DELETE CASCADE,
+        animals                    INTEGER NOT NULL DEFAULT 0,
+        keepers                    INTEGER NOT NULL DEFAULT 0
+    );"""
+
+categorystatssql = """
+    CREATE TABLE IF NOT EXISTS category_stats(
+        animalcat_id               INTEGER PRIMARY KEY REFERENCES animalcat(animalcat_id) ON DELETE CASCADE,
+        breeds                     INTEGER NOT NULL DEFAULT 0,
+        animals                    INTEGER NOT NULL DEFAULT 0
+    );"""
+
+statsrebuildsql = """
+    CREATE OR REPLACE FUNCTION zoo_stats_rebuild() RETURNS void AS $$
+    BEGIN
+        DELETE FROM enclosure_stats;
+        INSERT INTO enclosure_stats (enclosure_id, animals, keepers)
+            SELECT enclosure.enclosure_id,
+                   (SELECT count(*) FROM animal WHERE animal.enclosure_id = enclosure.enclosure_id),
+                   (SELECT count(*) FROM keeper WHERE keeper.enclosure_id = enclosure.enclosure_id)
+            FROM enclosure;
+        DELETE FROM category_stats;
+        INSERT INTO category_stats (animalcat_id) SELECT animalcat_id FROM animalcat;
+        PERFORM zoo_stats_recount(ARRAY(SELECT animalcat_id FROM animalcat));
+    END
+    $$ LANGUAGE plpgsql"""
+
+# breeds can move between categories and take their animals along, so the
+# categories they touch are counted again (two indexed counts each)
+statsrecountsql = """
+    CREATE OR REPLACE FUNCTION zoo_stats_recount(ids INTEGER[]) RETURNS void AS $$
+    BEGIN
+        UPDATE category_stats SET
+            breeds = (SELECT count(*) FROM animalbreed WHERE animalbreed.animalcat_id = category_stats.animalcat_id),
+            animals = (SELECT count(*) FROM animal
+                       JOIN animalbreed ON animalbreed.animalbreed_id = animal.animalbreed_id
+                       WHERE animalbreed.animalcat_id = category_stats.animalcat_id)
+        WHERE animalcat_id = ANY(ids);
+    END
+    $$ LANGUAGE plpgsql"""
+
+statstruncatesql = """
+    CREATE OR REPLACE FUNCTION zoo_stats_truncate() RETURNS trigger AS $$
+    BEGIN
+        PERFORM zoo_stats_rebuild();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""
+
+
+#body of a stats trigger function: template gets {rows} (the changed rows
+#with a +1/-1 column n) once for INSERT, DELETE and UPDATE
+def _stats_function(name, template):
+    sources = {
+        'INSERT': "SELECT *, 1 AS n FROM new_rows",
+        'DELETE': "SELECT *, -1 AS n FROM old_rows",
+        'UPDATE': "SELECT *, 1 AS n FROM new_rows UNION ALL SELECT *, -1 AS n FROM old_rows",
+    }
+    branches = []
+    for op, rows in sources.items():
+        keyword = 'IF' if not branches else 'ELSIF'
+        branches.append(f"{keyword} TG_OP = '{op}' THEN\n" + template.lstrip('\n').format(rows=rows))
+    return (f"CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$\nBEGIN\n"
+            + "\n".join(branches) + "\nEND IF;\nRETURN NULL;\nEND\n$$ LANGUAGE plpgsql")
+
+
+STATS_FUNCTIONS = {
+    'enclosure': _stats_function('zoo_stats_enclosure', """
+        INSERT INTO enclosure_stats (enclosure_id)
+            SELECT enclosure_id FROM ({rows}) changed WHERE n > 0
+            ON CONFLICT DO NOTHING;"""),
+    'animalcat': _stats_function('zoo_stats_animalcat', """
+        INSERT INTO category_stats (animalcat_id)
+            SELECT animalcat_id FROM ({rows}) changed WHERE n > 0
+            ON CONFLICT DO NOTHING;"""),
+    'keeper': _stats_function('zoo_stats_keeper', """
+        UPDATE enclosure_stats SET keepers = keepers + delta.n
+            FROM (SELECT enclosure_id, sum(n) AS n FROM ({rows}) changed
+                  GROUP BY enclosure_id HAVING sum(n) <> 0) delta
+            WHERE enclosure_stats.enclosure_id = delta.enclosure_id;"""),
+    # animals deleted by a breed cascade find no breed any more, the breed
+    # trigger counts their category again afterwards
+    'animal': _stats_function('zoo_stats_animal', """
+        UPDATE enclosure_stats SET animals = animals + delta.n
+            FROM (SELECT enclosure_id, sum(n) AS n FROM ({rows}) changed
+                  GROUP BY enclosure_id HAVING sum(n) <> 0) delta
+            WHERE enclosure_stats.enclosure_id = delta.enclosure_id;
+        UPDATE category_stats SET animals = animals + delta.n
+            FROM (SELECT animalbreed.animalcat_id, sum(n) AS n FROM ({rows}) changed
+                  JOIN animalbreed ON animalbreed.animalbreed_id = changed.animalbreed_id
+                  GROUP BY animalbreed.animalcat_id HAVING sum(n) <> 0) delta
+            WHERE category_stats.animalcat_id = delta.animalcat_id;"""),
+    'animalbreed': _stats_function('zoo_stats_animalbreed', """
+        PERFORM zoo_stats_recount(ARRAY(SELECT DISTINCT animalcat_id FROM ({rows}) changed));"""),
+}
+
+
+# enclosures and categories only need a stats row once they exist,
+# their deletes cascade to the stats tables
+STATS_TRIGGERS = {
+    'enclosure': ['insert'],
+    'animalcat': ['insert'],
+    'animalbreed': ['insert', 'delete', 'update'],
+    'keeper': ['insert', 'delete', 'update'],
+    'animal': ['insert', 'delete', 'update'],
+}
+
+TRANSITION_TABLES = {
+    'insert': "NEW TABLE AS new_rows",
+    'delete': "OLD TABLE AS old_rows",
+    'update': "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+}
+
+
+def _stats_triggers():
+    statements = []
+    for table in ZOO_TABLES:
+        statements.append(STATS_FUNCTIONS[table])
+        for op in STATS_TRIGGERS[table]:
+            referencing = TRANSITION_TABLES[op]
+            statements.append(f"DROP TRIGGER IF EXISTS {table}_stats_{op} ON {table}")
+            statements.append(
+                f"CREATE TRIGGER {table}_stats_{op} AFTER {op.upper()} ON {table} REFERENCING {referencing} "
+                f"FOR EACH STATEMENT EXECUTE PROCEDURE zoo_stats_{table}()")
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_stats_truncate ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {table}_stats_truncate AFTER TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE PROCEDURE zoo_stats_truncate()")
+    return statements
+
+
+# change notifications: one NOTIFY per statement on NOTIFY_CHANNEL with
+# {"table", "op", "ids"}; ids is null for TRUNCATE and for statements that
+# touched more than NOTIFY_MAX_IDS rows (payloads stop at 8000 bytes)
+NOTIFY_CHANNEL = 'zoo_changes'
+NOTIFY_MAX_IDS = 500
+
+
+def _notify_function(table):
+    return f"""
+    CREATE OR REPLACE FUNCTION zoo_notify_{table}() RETURNS trigger AS $$
+    DECLARE
+        ids INTEGER[];
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            ids := ARRAY(SELECT {table}_id FROM old_rows);
+        ELSIF TG_OP <> 'TRUNCATE' THEN
+            ids := ARRAY(SELECT {table}_id FROM new_rows);
+        END IF;
+        IF cardinality(ids) = 0 THEN
+            RETURN NULL;
+        END IF;
+        IF cardinality(ids) > {NOTIFY_MAX_IDS} THEN
+            ids := NULL;
+        END IF;
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', ids)::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""
+
+
+#statement triggers {table}_{kind}_{op} for every write and TRUNCATE,
+#all calling zoo_{kind}_{table}()
+def _statement_triggers(table, kind):
+    statements = []
+    for op, referencing in TRANSITION_TABLES.items():
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_{kind}_{op} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {table}_{kind}_{op} AFTER {op.upper()} ON {table} REFERENCING {referencing} "
+            f"FOR EACH STATEMENT EXECUTE PROCEDURE zoo_{kind}_{table}()")
+    statements.append(f"DROP TRIGGER IF EXISTS {table}_{kind}_truncate ON {table}")
+    statements.append(
+        f"CREATE TRIGGER {table}_{kind}_truncate AFTER TRUNCATE ON {table} "
+        f"FOR EACH STATEMENT EXECUTE PROCEDURE zoo_{kind}_{table}()")
+    return statements
+
+
+def _notify_triggers():
+    statements = []
+    for table in ZOO_TABLES:
+        statements.append(_notify_function(table))
+        statements += _statement_triggers(table, 'notify')
+    return statements
+
+
+# one search table over the names of all five tables, (kind, id) is the
+# table and its primary key. 'simple' neither stems nor drops stop words,
+# names are not english sentences
+SEARCH_COLUMNS = {
+    'animal': 'name',
+    'animalbreed': 'breed',
+    'animalcat': 'category',
+    'keeper': 'name',
+    'enclosure': 'name',
+}
+
+searchsql = """
+    CREATE TABLE IF NOT EXISTS search_index(
+        kind                       VARCHAR(20) NOT NULL,
+        id                         INTEGER NOT NULL,
+        label                      VARCHAR(100) NOT NULL,
+        document                   tsvector NOT NULL,
+        PRIMARY KEY (kind, id)
+    );"""
+
+
+def _search_document(column):
+    return f"to_tsvector('simple', coalesce({column}, ''))"
+
+
+#updates only rewrite the rows whose name changed, a bulk move of animals
+#between enclosures leaves the index alone
+def _search_function(table):
+    column = SEARCH_COLUMNS[table]
+    return f"""
+    CREATE OR REPLACE FUNCTION zoo_search_{table}() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM search_index WHERE kind = '{table}';
+        ELSIF TG_OP = 'DELETE' THEN
+            DELETE FROM search_index USING old_rows
+                WHERE search_index.kind = '{table}' AND search_index.id = old_rows.{table}_id;
+        ELSIF TG_OP = 'INSERT' THEN
+            INSERT INTO search_index (kind, id, label, document)
+                SELECT '{table}', {table}_id, coalesce({column}, ''), {_search_document(column)} FROM new_rows;
+        ELSE
+            UPDATE search_index SET label = coalesce(new_rows.{column}, ''),
+                                    document = {_search_document(f"new_rows.{column}")}
+                FROM new_rows JOIN old_rows ON old_rows.{table}_id = new_rows.{table}_id
+                WHERE search_index.kind = '{table}' AND search_index.id = new_rows.{table}_id
+                  AND new_rows.{column} IS DISTINCT FROM old_rows.{column};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""
+
+
+def _search_index():
+    statements = [searchsql, "CREATE INDEX IF NOT EXISTS search_index_document_idx ON search_index USING gin (document)"]
+    for table, column in SEARCH_COLUMNS.items():
+        statements.append(_search_function(table))
+        statements += _statement_triggers(table, 'search')
+        statements.append(
+            f"INSERT INTO search_index (kind, id, label, document) "
+            f"SELECT '{table}', {table}_id, coalesce({column}, ''), {_search_document(column)} FROM {table} "
+            f"ON CONFLICT DO NOTHING")
+    return statements
+
+
+# forward only: (version, description, statements, optional)
+# an optional migration that fails is left unrecorded instead of blocking
+# startup (e.g. pg_trgm without the rights to install it) and is tried
+# again on the next migrate
+MIGRATIONS = [
+    (1, "base tables", [encolsuresql, catsql, breedsql, keepersql, animalsql], False),
+    (2, "foreign key indexes", [
+        "CREATE INDEX IF NOT EXISTS animalbreed_animalcat_id_idx ON animalbreed (animalcat_id)",
+        "CREATE INDEX IF NOT EXISTS keeper_enclosure_id_idx ON keeper (enclosure_id)",
+        "CREATE INDEX IF NOT EXISTS animal_animalbreed_id_idx ON animal (animalbreed_id)",
+        "CREATE INDEX IF NOT EXISTS animal_enclosure_id_idx ON animal (enclosure_id)",
+        "CREATE INDEX IF NOT EXISTS animalcat_category_idx ON animalcat (category)",
+    ], False),
+    (3, "trigram index on animal names", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS animal_name_trgm_idx ON animal USING gin (name gin_trgm_ops)",
+    ], True),
+    (4, "animal overview materialized view", [
+        overviewsql,
+        "CREATE UNIQUE INDEX IF NOT EXISTS animal_overview_animal_id_idx ON animal_overview (animal_id)",
+        overviewstatesql,
+        "INSERT INTO overview_state (id, dirty) VALUES (true, false) ON CONFLICT DO NOTHING",
+        overviewdirtysql,
+    ] + _overview_triggers(), False),
+    (5, "summary tables for the statistics screen", [
+        enclosurestatssql,
+        categorystatssql,
+        statsrecountsql,
+        statsrebuildsql,
+        statstruncatesql,
+    ] + _stats_triggers() + ["SELECT zoo_stats_rebuild()"], False),
+    (6, "change notifications for cache invalidation", _notify_triggers(), False),
+    (7, "full text search index over all names", _search_index(), False),
+    (8, "overview version counter instead of the dirty flag", [
+        "ALTER TABLE overview_state ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1",
+        "ALTER TABLE overview_state ADD COLUMN IF NOT EXISTS refreshed BIGINT NOT NULL DEFAULT 0",
+        "UPDATE overview_state SET refreshed = version WHERE NOT dirty",
+        "ALTER TABLE overview_state DROP COLUMN dirty",
+        overviewversionsql,
+        overviewrefreshsql,
+    ] + _overview_triggers('BEFORE'), False),
+    (9, "overview changes per transaction instead of the version counter", [
+        overviewchangessql,
+        "INSERT INTO overview_changes (xid) SELECT txid_current() FROM overview_state WHERE version <> refreshed",
+        overviewchangesql,
+        overviewtryrefreshsql,
+    ] + _overview_triggers() + ["DROP TABLE overview_state"], False),
+]
+
+#hash of every migration, changes when one is added or edited
+def fingerprint(migrations=MIGRATIONS):
+    import hashlib
+    digest = hashlib.sha1()
+    for version, description, statements, optional in sorted(migrations, key=lambda m: m[0]):
+        digest.update(repr((version, statements, optional)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+#local file {database: fingerprint} of schemas known to be current, so a
+#startup can skip even the version check; `main.py migrate` always asks
+#the database (run it after dropping or restoring one)
+def read_fingerprint(path, key):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+
+def store_fingerprint(path, key, value):
+    try:
+        with open(path, encoding='utf-8') as f:
+            known = json.load(f)
+    except (OSError, ValueError):
+        known = {}
+    known[key] = value
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(known, f, indent=2)
+    except OSError as e:
+        logging.error(f"schema cache not written: {e}")
+
+
+# serializes concurrent startups that both find the schema out of date
+LOCK_ID = 153153
+
+APPLIED = "right(description, 9) <> '(skipped)'"
+
+
+class ZooMigrator:
+
+    def __init__(self, dao, migrations=MIGRATIONS):
+        self.dao = dao
+        self.migrations = sorted(migrations, key=lambda m: m[0])
+        self.skipped = []
+
+    def latest_version(self):
+        return self.migrations[-1][0] if self.migrations else 0
+
+    def current_version(self):
+        return max(self.applied_versions(), default=0)
+
+    #rows an older version wrote for a skipped optional migration do not count
+    def applied_versions(self):
+        try:
+            with self.dao.cursor() as cur:
+                cur.execute(f"SELECT version FROM schema_version WHERE {APPLIED}")
+                return {row[0] for row in cur.fetchall()}
+        except psycopg2.errors.UndefinedTable:
+            return set()
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [m for m in self.migrations if m[0] not in applied]
+
+    #brings the schema up to target (default latest), returns applied versions;
+    #optional ones that failed again are in self.skipped
+    #a current schema costs exactly one SELECT
+    def migrate(self, target=None):
+        target = self.latest_version() if target is None else target
+        self.skipped = []
+        pending = [m for m in self.pending() if m[0] <= target]
+        applied = []
+        for version, description, statements, optional in pending:
+            with self.dao.cursor() as cur:
+                cur.execute(versionsql)
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_ID,))
+                cur.execute(f"SELECT 1 FROM schema_version WHERE version = %s AND {APPLIED}", (version,))
+                if cur.fetchone() is None:
+                    if self._apply(cur, version, statements, optional):
+                        cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s) "
+                                    "ON CONFLICT (version) DO UPDATE SET description = excluded.description, "
+                                    "applied_at = now()", (version, description))
+                        applied.append(version)
+                    else:
+                        self.skipped.append(version)
+                self.dao.commit(cur)
+        return applied
+
+    def _apply(self, cur, version, statements, optional):
+        if optional:
+            cur.execute("SAVEPOINT zoo_migration")
+        try:
+            for statement in statements:
+                cur.execute(statement)
+        except psycopg2.Error as e:
+            if not optional:
+                raise
+            logging.error(f"migration {version} skipped, retried on the next migrate: {e}")
+            cur.execute("ROLLBACK TO SAVEPOINT zoo_migration")
+            return False
+        return True
+
+    #index management: size and scan counts of every index on the zoo tables
+    def indexes(self):
+        sql = """
+            SELECT relname, indexrelname, idx_scan, pg_size_pretty(pg_relation_size(indexrelid))
+            FROM pg_stat_user_indexes
+            WHERE relname IN ('enclosure', 'animalcat', 'animalbreed', 'keeper', 'animal', 'animal_overview',
+                              'search_index')
+            ORDER BY relname, indexrelname
+        """
+        with self.dao.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchall()
@@ -0,0 +1,84 @@
+import json
+import logging
+import select
+import threading
+import psycopg2
+import psycopg2.extensions
+from zoo.zooMigrations import NOTIFY_CHANNEL
+
+
+class ZooListener:
+
+    #LISTENs on its own autocommit connection in a daemon thread and calls
+    #on_change(table, op, ids) per notification (ids None = the whole
+    #table); after every (re)connect on_reset() runs, since whatever was
+    #sent while nobody listened is lost
+    def __init__(self, params, on_change, on_reset, channel=NOTIFY_CHANNEL, retry=1.0, timeout=1.0):
+        self.params = params
+        self.on_change = on_change
+        self.on_reset = on_reset
+        self.channel = channel
+        self.retry = retry
+        self.timeout = timeout
+        self.connected = False
+        self.received = 0
+        self.connects = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='zoo-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.params)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel}")
+                self.connects += 1
+                self.connected = True
+                self.on_reset()
+                self._listen(conn)
+            except (psycopg2.Error, OSError) as e:
+                logging.error(f"cache listener: {e}")
+                self.errors += 1
+                self.last_error = str(e)
+                self._stop.wait(self.retry)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+
+    # wakes up every timeout seconds to notice stop()
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            if select.select([conn], [], [], self.timeout) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                self._dispatch(conn.notifies.pop(0).payload)
+
+    def _dispatch(self, payload):
+        try:
+            change = json.loads(payload)
+            table, op, ids = change['table'], change['op'], change.get('ids')
+        except (ValueError, KeyError, TypeError) as e:
+            logging.error(f"cache listener: bad notification {payload!r}: {e}")
+            return
+        self.received += 1
+        self.on_change(table, op, ids)
+
+    def stats(self):
+        return {'connected': self.connected, 'received': self.received, 'connects': self.connects,
+                'errors': self.errors, 'last_error': self.last_error}
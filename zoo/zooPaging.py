@@ -0,0 +1,44 @@
+import collections
+
+# one page of rows in id order; next/previous are tokens for the
+# neighbouring pages, None at either end
+Page = collections.namedtuple('Page', ['rows', 'next', 'previous'])
+
+PAGE_SIZE = 20
+
+
+#tokens are plain strings ("after:<id>" / "before:<id>") so they can be
+#printed, stored or passed on the command line
+def after(key):
+    return f"after:{key}"
+
+
+def before(key):
+    return f"before:{key}"
+
+
+#token -> (direction, key), None is the first page
+def parse_token(token):
+    if token is None:
+        return 'after', 0
+    direction, _, key = str(token).partition(':')
+    if direction not in ('after', 'before') or not key.isdigit():
+        raise ValueError(f"invalid page token: {token!r}")
+    return direction, int(key)
+
+
+#rows fetched with limit + 1 (the extra row says whether there is more in
+#that direction), before pages come back newest first; earlier = an after
+#page has rows before it. An empty after page (everything past key was
+#deleted) still leads back to the page it came from
+def make_page(rows, direction, key, limit, earlier=False):
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'before':
+        rows.reverse()
+        return Page(rows, after(rows[-1][0]), before(rows[0][0]) if more else None)
+    if not rows:
+        return Page([], None, before(key + 1) if earlier else None)
+    return Page(rows,
+                after(rows[-1][0]) if more else None,
+                before(rows[0][0]) if earlier else None)
@@ -0,0 +1,179 @@
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ZooPool:
+
+    #thread safe pool with checkout timeout and idle recycle
+    def __init__(self, params, minconn=1, maxconn=10, timeout=5.0, recycle=300.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("invalid pool size: minconn={0}, maxconn={1}".format(minconn, maxconn))
+        self.params = params
+        self.minconn, self.maxconn = minconn, maxconn
+        self.timeout, self.recycle = timeout, recycle
+        self.closed = False
+        self._cond = threading.Condition()
+        self._idle = []          # (conn, returned_at), most recently used last
+        self._size = 0           # open connections, idle + checked out
+        self._in_use = 0
+        # stats
+        self._created = time.monotonic()
+        self._last_change = self._created
+        self._busy_area = 0.0    # integral of in_use over time
+        self.checkouts = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    @classmethod
+    def from_config(cls, params, options):
+        return cls(
+            params,
+            minconn=int(options.get('minconn', 1)),
+            maxconn=int(options.get('maxconn', 10)),
+            timeout=float(options.get('timeout', 5)),
+            recycle=float(options.get('recycle', 300)),
+        )
+
+    def _open(self):
+        return psycopg2.connect(**self.params)
+
+    def _account(self, delta):
+        # caller holds the lock
+        now = time.monotonic()
+        self._busy_area += self._in_use * (now - self._last_change)
+        self._last_change = now
+        self._in_use += delta
+
+    def _discard(self, conn):
+        # caller holds the lock
+        self._size -= 1
+        self.recycled += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _pop_idle(self):
+        # caller holds the lock; hands out the most recently used connection.
+        # _idle is in return order, so every connection idle for longer than
+        # recycle sits at the front and is dropped here, not only the popped
+        # one (under light load the bottom of the stack is never popped)
+        now = time.monotonic()
+        if self.recycle:
+            while self._idle and now - self._idle[0][1] > self.recycle:
+                self._discard(self._idle.pop(0)[0])
+        while self._idle:
+            conn, _ = self._idle.pop()
+            if conn.closed:
+                self._discard(conn)
+                continue
+            return conn
+        return None
+
+    def getconn(self):
+        start = time.monotonic()
+        conn = None
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+                conn = self._pop_idle()
+                if conn is not None:
+                    break
+                if self._size < self.maxconn:
+                    # reserve the slot, connect outside the lock
+                    self._size += 1
+                    break
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout("no free connection after {0:.1f}s ({1} in use)".format(self.timeout, self._in_use))
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._account(1)
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            self._account(-1)
+            if not close and not self.closed and not conn.closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close or self.closed or conn.closed:
+                self._size -= 1
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    #drop the idle connections, e.g. after their server went away; the pool
+    #stays open and connects again on the next getconn
+    def closeidle(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+            self._cond.notify_all()
+
+    def closeall(self):
+        with self._cond:
+            self.closed = True
+            for conn, _ in self._idle:
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            busy = self._busy_area + self._in_use * (now - self._last_change)
+            elapsed = now - self._created
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'maxconn': self.maxconn,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'recycled': self.recycled,
+                'wait_total': self.wait_total,
+                'wait_avg': self.wait_total / self.checkouts if self.checkouts else 0.0,
+                'wait_max': self.wait_max,
+                'utilization': busy / (elapsed * self.maxconn) if elapsed > 0 else 0.0,
+            }
@@ -0,0 +1,123 @@
+import itertools
+import logging
+import threading
+import time
+import psycopg2
+from psycopg2.pool import PoolError
+from zoo.zooPool import ZooPool
+
+# seconds the replay is behind, 0 on a primary and on a standby that has
+# replayed all the WAL it received: the time since the last replayed
+# transaction keeps growing while the primary is idle
+LAG_SQL = """
+    SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END"""
+
+
+class Replica:
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lag = None
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaSet:
+
+    #read only servers from [replica] / [replica.<name>] sections, each with
+    #its own pool; reads rotate over the healthy ones, a replica that failed
+    #or lags more than max_lag seconds is skipped until the next check
+    def __init__(self, replicas, check_interval=10.0, max_lag=None):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._next = itertools.cycle(range(len(replicas)))
+        self._lock = threading.Lock()
+
+    #replica sections inherit everything they leave out from the primary
+    @classmethod
+    def from_config(cls, reader, params):
+        names = [section for section in reader.sections() if section == 'replica' or section.startswith('replica.')]
+        if not names:
+            return None
+        routing = reader.config('routing') if reader.has_section('routing') else {}
+        pool_options = dict(reader.config('pool')) if reader.has_section('pool') else {}
+        # no connection at startup, a replica that is down must not stop the app
+        pool_options['minconn'] = 0
+        replicas = [Replica(name, ZooPool.from_config(dict(params, **reader.config(name)), pool_options))
+                    for name in names]
+        max_lag = routing.get('max_lag')
+        return cls(replicas,
+                   check_interval=float(routing.get('check_interval', 10)),
+                   max_lag=float(max_lag) if max_lag else None)
+
+    #a connection to the next healthy replica, or None when there is none
+    def getconn(self):
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[next(self._next)]
+            now = time.monotonic()
+            due = now - replica.checked_at >= self.check_interval
+            if not replica.healthy and not due:
+                continue
+            try:
+                conn = replica.pool.getconn()
+            except PoolError:
+                # all its connections busy, the server may be fine
+                continue
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                self.mark_down(replica, e)
+                continue
+            if due and not self._check(replica, conn, now):
+                continue
+            replica.reads += 1
+            return replica, conn
+        return None
+
+    def _check(self, replica, conn, now):
+        try:
+            with conn.cursor() as cur:
+                cur.execute(LAG_SQL)
+                replica.lag = float(cur.fetchone()[0])
+            conn.rollback()
+        except psycopg2.Error as e:
+            replica.pool.putconn(conn, close=True)
+            self.mark_down(replica, e)
+            return False
+        replica.checked_at = now
+        replica.healthy = self.max_lag is None or replica.lag <= self.max_lag
+        if not replica.healthy:
+            logging.error(f"replica {replica.name} lags {replica.lag:.1f}s, reading from elsewhere")
+            replica.pool.putconn(conn)
+        return replica.healthy
+
+    #the first error on a connection the server dropped can be a plain
+    #DatabaseError, conn.closed tells
+    def putconn(self, replica, conn, error=None):
+        if conn.closed or isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            replica.pool.putconn(conn, close=True)
+            self.mark_down(replica, error)
+        else:
+            replica.pool.putconn(conn)
+
+    def mark_down(self, replica, error):
+        logging.error(f"replica {replica.name} unavailable: {error}")
+        replica.healthy = False
+        replica.failures += 1
+        replica.checked_at = time.monotonic()
+        # its idle connections died with it, the next check needs a new one
+        replica.pool.closeidle()
+
+    def stats(self):
+        return [{'name': replica.name, 'healthy': replica.healthy, 'lag': replica.lag,
+                 'reads': replica.reads, 'failures': replica.failures, 'pool': replica.pool.stats()}
+                for replica in self.replicas]
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica.pool.closeall()
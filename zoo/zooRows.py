@@ -0,0 +1,132 @@
+import functools
+from collections import namedtuple
+
+# one row class per table, fields in table column order; namedtuples have
+# no per-row __dict__ and still index and unpack like the plain tuples
+Enclosure = namedtuple('Enclosure', ['enclosure_id', 'name', 'size'])
+AnimalCat = namedtuple('AnimalCat', ['animalcat_id', 'category'])
+AnimalBreed = namedtuple('AnimalBreed', ['animalbreed_id', 'breed', 'animalcat_id'])
+Keeper = namedtuple('Keeper', ['keeper_id', 'name', 'enclosure_id'])
+Animal = namedtuple('Animal', ['animal_id', 'name', 'birthday', 'animalbreed_id', 'enclosure_id'])
+AnimalOverview = namedtuple('AnimalOverview',
+                            ['animal_id', 'animal', 'birthday', 'breed', 'category', 'enclosure', 'keepers'])
+BreedCategory = namedtuple('BreedCategory', ['animalbreed_id', 'breed', 'category'])
+# kind is the table the name is from, id its primary key there
+SearchHit = namedtuple('SearchHit', ['kind', 'id', 'label', 'rank'])
+
+# table (or view) -> row class
+TABLES = {
+    'enclosure': Enclosure,
+    'animalcat': AnimalCat,
+    'animalbreed': AnimalBreed,
+    'keeper': Keeper,
+    'animal': Animal,
+    'animal_overview': AnimalOverview,
+}
+
+# registry statement -> the row class its rows come back as
+STATEMENT_ROWS = {
+    'view_all_enclosures': Enclosure,
+    'get_enclosure_by_id': Enclosure,
+    'page_enclosures': Enclosure,
+    'page_enclosures_before': Enclosure,
+    'view_all_animalcats': AnimalCat,
+    'get_animalcat_by_id': AnimalCat,
+    'page_animalcats': AnimalCat,
+    'page_animalcats_before': AnimalCat,
+    'view_all_animalbreed': AnimalBreed,
+    'get_animalbreed_by_id': AnimalBreed,
+    'page_animalbreed': AnimalBreed,
+    'page_animalbreed_before': AnimalBreed,
+    'view_all_keepers': Keeper,
+    'get_keeper_by_id': Keeper,
+    'view_keepers_by_enclosure': Keeper,
+    'page_keepers': Keeper,
+    'page_keepers_before': Keeper,
+    'view_all_animals': Animal,
+    'get_animal_by_id': Animal,
+    'page_animals': Animal,
+    'page_animals_before': Animal,
+    'search_animal_name': Animal,
+    'search_animal_name_plain': Animal,
+    'view_animal_overview': AnimalOverview,
+    'page_animal_overview': AnimalOverview,
+    'page_animal_overview_before': AnimalOverview,
+    'filter_breeds_by_categories': BreedCategory,
+    'search': SearchHit,
+}
+
+
+#row class for a subset of a table's columns, e.g. (animal_id, name)
+@functools.lru_cache(maxsize=None)
+def _subset(row_class, columns):
+    return namedtuple(row_class.__name__, columns)
+
+
+#(SELECT sql, row class) for some columns of table, all of them for None;
+#column names are checked against the row class, never pasted in as given
+def projection(table, columns=None):
+    row_class = TABLES[table]
+    if not columns:
+        return f"SELECT {', '.join(row_class._fields)} FROM {table}", row_class
+    unknown = [column for column in columns if column not in row_class._fields]
+    if unknown:
+        raise ValueError(f"unknown {table} column(s) {', '.join(map(repr, unknown))}, "
+                         f"expected some of {', '.join(row_class._fields)}")
+    columns = tuple(columns)
+    if columns == row_class._fields:
+        return f"SELECT {', '.join(columns)} FROM {table}", row_class
+    return f"SELECT {', '.join(columns)} FROM {table}", _subset(row_class, columns)
+
+
+#cursor class that builds row objects straight from the tuples psycopg2
+#returns: execute(sql, params, row=Animal) and every fetch of that result
+#gives Animal rows, without the dict per row of a RealDictCursor
+def row_cursor(base):
+
+    class RowCursor(base):
+
+        row_class = None
+
+        def execute(self, sql, params=None, row=None):
+            self.row_class = row
+            return super().execute(sql, params)
+
+        def fetchone(self):
+            result = super().fetchone()
+            if result is None or self.row_class is None:
+                return result
+            return self.row_class._make(result)
+
+        def fetchmany(self, size=None):
+            return self._make_all(super().fetchmany(self.arraysize if size is None else size))
+
+        def fetchall(self):
+            return self._make_all(super().fetchall())
+
+        # row by row into the list psycopg2 returned, each tuple is freed as
+        # its row replaces it, so there is never a second list of the result
+        def _make_all(self, rows):
+            if self.row_class is not None:
+                make = self.row_class._make
+                for i, row in enumerate(rows):
+                    rows[i] = make(row)
+            return rows
+
+        # the C iterator is the cursor itself, so step it with next(), a
+        # for loop would land back in this __iter__
+        def __iter__(self):
+            rows = super().__iter__()
+            if self.row_class is None:
+                return rows
+            return self._rows(rows, self.row_class)
+
+        def _rows(self, rows, row_class):
+            while True:
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                yield row_class._make(row)
+
+    return RowCursor
@@ -0,0 +1,450 @@
+import datetime
+import functools
+import itertools
+import json
+import logging
+import re
+import sqlite3
+import time
+from collections import namedtuple
+import psycopg2
+from zoo.zooApp import zooApp
+from zoo.zooMigrations import SEARCH_COLUMNS
+from zoo.zooRows import row_cursor
+from zoo.zooStatements import STATEMENTS, StatementRegistry
+
+# birthdays go in as ISO text and come back as dates, like from postgres
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_converter('DATE', lambda value: datetime.date.fromisoformat(value.decode()))
+
+# the zooApp registry in SQLite's dialect: no ILIKE, arrays or ::casts;
+# search_animal_name needs pg_trgm, trigram_available() is always False here
+SQLITE_STATEMENTS = {name: sql for name, sql in STATEMENTS.items() if name != 'search_animal_name'}
+SQLITE_STATEMENTS.update({
+    "search_animal_name_plain": """
+        SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal
+        WHERE name LIKE %s ESCAPE '\\'
+        ORDER BY animal_id
+        LIMIT coalesce(%s, -1) OFFSET %s
+    """,
+    # the list of categories is bound as one JSON array
+    "filter_breeds_by_categories": """
+        SELECT animalbreed.animalbreed_id, animalbreed.breed, animalcat.category
+        FROM animalbreed
+        JOIN animalcat ON animalbreed.animalcat_id = animalcat.animalcat_id
+        WHERE animalcat.category IN (SELECT value FROM json_each(%s))
+        ORDER BY animalcat.category, animalbreed.breed, animalbreed.animalbreed_id
+    """,
+    # FTS5 MATCH syntax; bm25() is lower for better matches
+    "search": """
+        SELECT kind, id, label, -bm25(search_index) AS rank
+        FROM search_index
+        WHERE search_index MATCH %s AND kind IN (SELECT value FROM json_each(%s))
+        ORDER BY rank DESC, length(label), kind, id
+        LIMIT coalesce(%s, -1) OFFSET %s
+    """,
+    "stats_enclosures": """
+        SELECT enclosure.enclosure_id, enclosure.name, enclosure.size, enclosure_stats.animals, enclosure_stats.keepers,
+               round(CAST(enclosure_stats.animals AS REAL) / NULLIF(enclosure.size, 0), 4) AS density
+        FROM enclosure_stats
+        JOIN enclosure ON enclosure.enclosure_id = enclosure_stats.enclosure_id
+        ORDER BY enclosure.enclosure_id
+    """,
+})
+
+# same tables and columns as zooMigrations; ids are rowid aliases
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS enclosure(
+        enclosure_id               INTEGER PRIMARY KEY,
+        name                       VARCHAR(100),
+        size                       INT
+    )""",
+    """CREATE TABLE IF NOT EXISTS animalcat(
+        animalcat_id               INTEGER PRIMARY KEY,
+        category                   VARCHAR(100)
+    )""",
+    """CREATE TABLE IF NOT EXISTS animalbreed(
+        animalbreed_id             INTEGER PRIMARY KEY,
+        breed                      VARCHAR(100),
+        animalcat_id               INTEGER REFERENCES animalcat(animalcat_id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS keeper(
+        keeper_id                  INTEGER PRIMARY KEY,
+        name                       VARCHAR(100),
+        enclosure_id               INTEGER REFERENCES enclosure(enclosure_id) ON DELETE CASCADE
+    )""",
+    # sqlite would store any text, postgres rejects what is not a date
+    # ('+0 days' normalizes 2021-02-30 to 2021-03-02, so that fails too)
+    """CREATE TABLE IF NOT EXISTS animal(
+        animal_id                  INTEGER PRIMARY KEY,
+        name                       VARCHAR(100),
+        birthday                   DATE CHECK (birthday IS NULL OR date(birthday, '+0 days') IS birthday),
+        animalbreed_id             INTEGER REFERENCES animalbreed(animalbreed_id) ON DELETE CASCADE,
+        enclosure_id               INTEGER REFERENCES enclosure(enclosure_id) ON DELETE CASCADE
+    )""",
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS animalbreed_animalcat_id_idx ON animalbreed (animalcat_id)",
+    "CREATE INDEX IF NOT EXISTS keeper_enclosure_id_idx ON keeper (enclosure_id)",
+    "CREATE INDEX IF NOT EXISTS animal_animalbreed_id_idx ON animal (animalbreed_id)",
+    "CREATE INDEX IF NOT EXISTS animal_enclosure_id_idx ON animal (enclosure_id)",
+    "CREATE INDEX IF NOT EXISTS animalcat_category_idx ON animalcat (category)",
+]
+
+# a plain view: always current, so refresh_overview() has nothing to do;
+# the keepers subquery goes through keeper_enclosure_id_idx
+OVERVIEW = """CREATE VIEW IF NOT EXISTS animal_overview AS
+    SELECT animal.animal_id,
+           animal.name                 AS animal,
+           animal.birthday,
+           animalbreed.breed,
+           animalcat.category,
+           enclosure.name              AS enclosure,
+           (SELECT group_concat(name, ', ')
+            FROM (SELECT keeper.name FROM keeper WHERE keeper.enclosure_id = animal.enclosure_id
+                  ORDER BY keeper.name)) AS keepers
+    FROM animal
+    LEFT JOIN animalbreed ON animalbreed.animalbreed_id = animal.animalbreed_id
+    LEFT JOIN animalcat ON animalcat.animalcat_id = animalbreed.animalcat_id
+    LEFT JOIN enclosure ON enclosure.enclosure_id = animal.enclosure_id"""
+
+STATS_TABLES = [
+    """CREATE TABLE IF NOT EXISTS enclosure_stats(
+        enclosure_id               INTEGER PRIMARY KEY REFERENCES enclosure(enclosure_id) ON DELETE CASCADE,
+        animals                    INTEGER NOT NULL DEFAULT 0,
+        keepers                    INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS category_stats(
+        animalcat_id               INTEGER PRIMARY KEY REFERENCES animalcat(animalcat_id) ON DELETE CASCADE,
+        breeds                     INTEGER NOT NULL DEFAULT 0,
+        animals                    INTEGER NOT NULL DEFAULT 0
+    )""",
+]
+
+STATS_REBUILD = [
+    "DELETE FROM enclosure_stats",
+    """INSERT INTO enclosure_stats (enclosure_id, animals, keepers)
+        SELECT enclosure.enclosure_id,
+               (SELECT count(*) FROM animal WHERE animal.enclosure_id = enclosure.enclosure_id),
+               (SELECT count(*) FROM keeper WHERE keeper.enclosure_id = enclosure.enclosure_id)
+        FROM enclosure""",
+    "DELETE FROM category_stats",
+    """INSERT INTO category_stats (animalcat_id, breeds, animals)
+        SELECT animalcat.animalcat_id,
+               (SELECT count(*) FROM animalbreed WHERE animalbreed.animalcat_id = animalcat.animalcat_id),
+               (SELECT count(*) FROM animal
+                JOIN animalbreed ON animalbreed.animalbreed_id = animal.animalbreed_id
+                WHERE animalbreed.animalcat_id = animalcat.animalcat_id)
+        FROM animalcat""",
+]
+
+# the category of a breed, for the animal triggers
+_CATEGORY = "(SELECT animalcat_id FROM animalbreed WHERE animalbreed_id = {}.animalbreed_id)"
+_BREED_ANIMALS = "(SELECT count(*) FROM animal WHERE animalbreed_id = {}.animalbreed_id)"
+
+# row triggers doing what the statement triggers of migration 5 do. A
+# breed's FK cascade deletes it before its animals, so the animals find no
+# category any more: the breed counts them itself, BEFORE it goes
+STATS_TRIGGERS = {
+    'enclosure_stats_insert': ("AFTER INSERT ON enclosure", [
+        "INSERT OR IGNORE INTO enclosure_stats (enclosure_id) VALUES (NEW.enclosure_id)"]),
+    'animalcat_stats_insert': ("AFTER INSERT ON animalcat", [
+        "INSERT OR IGNORE INTO category_stats (animalcat_id) VALUES (NEW.animalcat_id)"]),
+    'keeper_stats_insert': ("AFTER INSERT ON keeper", [
+        "UPDATE enclosure_stats SET keepers = keepers + 1 WHERE enclosure_id = NEW.enclosure_id"]),
+    'keeper_stats_delete': ("AFTER DELETE ON keeper", [
+        "UPDATE enclosure_stats SET keepers = keepers - 1 WHERE enclosure_id = OLD.enclosure_id"]),
+    'keeper_stats_update': ("AFTER UPDATE OF enclosure_id ON keeper", [
+        "UPDATE enclosure_stats SET keepers = keepers - 1 WHERE enclosure_id = OLD.enclosure_id",
+        "UPDATE enclosure_stats SET keepers = keepers + 1 WHERE enclosure_id = NEW.enclosure_id"]),
+    'animal_stats_insert': ("AFTER INSERT ON animal", [
+        "UPDATE enclosure_stats SET animals = animals + 1 WHERE enclosure_id = NEW.enclosure_id",
+        f"UPDATE category_stats SET animals = animals + 1 WHERE animalcat_id = {_CATEGORY.format('NEW')}"]),
+    'animal_stats_delete': ("AFTER DELETE ON animal", [
+        "UPDATE enclosure_stats SET animals = animals - 1 WHERE enclosure_id = OLD.enclosure_id",
+        f"UPDATE category_stats SET animals = animals - 1 WHERE animalcat_id = {_CATEGORY.format('OLD')}"]),
+    'animal_stats_update': ("AFTER UPDATE OF animalbreed_id, enclosure_id ON animal", [
+        "UPDATE enclosure_stats SET animals = animals - 1 WHERE enclosure_id = OLD.enclosure_id",
+        "UPDATE enclosure_stats SET animals = animals + 1 WHERE enclosure_id = NEW.enclosure_id",
+        f"UPDATE category_stats SET animals = animals - 1 WHERE animalcat_id = {_CATEGORY.format('OLD')}",
+        f"UPDATE category_stats SET animals = animals + 1 WHERE animalcat_id = {_CATEGORY.format('NEW')}"]),
+    'animalbreed_stats_insert': ("AFTER INSERT ON animalbreed", [
+        "UPDATE category_stats SET breeds = breeds + 1 WHERE animalcat_id = NEW.animalcat_id"]),
+    'animalbreed_stats_delete': ("BEFORE DELETE ON animalbreed", [
+        f"UPDATE category_stats SET breeds = breeds - 1, animals = animals - {_BREED_ANIMALS.format('OLD')} "
+        "WHERE animalcat_id = OLD.animalcat_id"]),
+    'animalbreed_stats_update': ("AFTER UPDATE OF animalcat_id ON animalbreed", [
+        f"UPDATE category_stats SET breeds = breeds - 1, animals = animals - {_BREED_ANIMALS.format('OLD')} "
+        "WHERE animalcat_id = OLD.animalcat_id",
+        f"UPDATE category_stats SET breeds = breeds + 1, animals = animals + {_BREED_ANIMALS.format('NEW')} "
+        "WHERE animalcat_id = NEW.animalcat_id"]),
+}
+
+
+def _stats_triggers():
+    return [f"CREATE TRIGGER IF NOT EXISTS {name} {when} FOR EACH ROW BEGIN\n"
+            + "".join(f"    {statement};\n" for statement in statements) + "END"
+            for name, (when, statements) in STATS_TRIGGERS.items()]
+
+
+# search_index of migration 7 as an FTS5 table. kind and id are not
+# indexed, so the rowid is id * 8 + the kind's number: triggers find the
+# entry of a row by rowid and not by scanning the table
+SEARCH_KINDS = {kind: number for number, kind in enumerate(SEARCH_COLUMNS)}
+
+SEARCH_TABLE = """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    label, kind UNINDEXED, id UNINDEXED, tokenize = 'unicode61', prefix = '2 3')"""
+
+
+def _search_index():
+    statements = [SEARCH_TABLE]
+    for table, column in SEARCH_COLUMNS.items():
+        rowid = f"{{}}.{table}_id * 8 + {SEARCH_KINDS[table]}"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} FOR EACH ROW BEGIN\n"
+            f"    INSERT INTO search_index (rowid, label, kind, id) "
+            f"VALUES ({rowid.format('NEW')}, coalesce(NEW.{column}, ''), '{table}', NEW.{table}_id);\nEND",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {column} ON {table} FOR EACH ROW BEGIN\n"
+            f"    UPDATE search_index SET label = coalesce(NEW.{column}, '') WHERE rowid = {rowid.format('NEW')};\nEND",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} FOR EACH ROW BEGIN\n"
+            f"    DELETE FROM search_index WHERE rowid = {rowid.format('OLD')};\nEND",
+            f"INSERT INTO search_index (rowid, label, kind, id) "
+            f"SELECT {rowid.format(table)}, coalesce({column}, ''), '{table}', {table}_id FROM {table}",
+        ]
+    return statements
+
+
+# forward only, the version is kept in PRAGMA user_version
+MIGRATIONS = [
+    (1, "base tables", TABLES),
+    (2, "foreign key indexes", INDEXES),
+    (3, "animal overview view", [OVERVIEW]),
+    (4, "summary tables for the statistics screen", STATS_TABLES + _stats_triggers() + STATS_REBUILD),
+    (5, "full text search index over all names", _search_index()),
+]
+
+Column = namedtuple('Column', ['name', 'type_code'])
+
+# sqlite3 errors reach the callers as the psycopg2 error zooApp catches
+ERRORS = [
+    (sqlite3.IntegrityError, psycopg2.IntegrityError),
+    (sqlite3.OperationalError, psycopg2.OperationalError),
+    (sqlite3.ProgrammingError, psycopg2.ProgrammingError),
+    (sqlite3.DataError, psycopg2.DataError),
+    (sqlite3.InterfaceError, psycopg2.InterfaceError),
+]
+
+
+def _error(e):
+    for sqlite_error, pg_error in ERRORS:
+        if isinstance(e, sqlite_error):
+            return pg_error(str(e))
+    return psycopg2.DatabaseError(str(e))
+
+
+#psycopg2 placeholders (%s, %% for a literal %) to sqlite's ?
+@functools.lru_cache(maxsize=512)
+def _qmark(sql):
+    return re.sub(r"%([s%])", lambda m: '?' if m.group(1) == 's' else '%', sql)
+
+
+class SqliteCursor:
+
+    #the part of a psycopg2 cursor zooApp uses; name= (a server side cursor
+    #there) steps through the result, any other cursor reads it at once,
+    #which also gets RETURNING rows out before the commit
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.arraysize = 1
+        self.closed = False
+        self._cur = connection.raw.cursor()
+        self._rows = None
+
+    def execute(self, sql, params=None):
+        if params is not None:
+            sql = _qmark(sql)
+            params = [json.dumps(value) if isinstance(value, list) else value for value in params]
+        start = time.perf_counter()
+        try:
+            if sql.lstrip()[:9].upper() == 'SAVEPOINT' and not self.connection.raw.in_transaction:
+                # an outermost SAVEPOINT would be its own transaction and
+                # RELEASE would commit it
+                self._cur.execute("BEGIN IMMEDIATE")
+            self._cur.execute(sql, params or ())
+            self._rows = None if self.name else iter(self._cur.fetchall())
+        except sqlite3.Error as e:
+            raise _error(e) from e
+        finally:
+            if self.connection.metrics is not None:
+                self.connection.metrics.record(sql, (time.perf_counter() - start) * 1000, self.rowcount)
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        if self._cur.description is None:
+            return None
+        return [Column(column[0], None) for column in self._cur.description]
+
+    def _fetchone(self):
+        if self._rows is not None:
+            return next(self._rows, None)
+        try:
+            return self._cur.fetchone()
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def fetchone(self):
+        return self._fetchone()
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._rows is not None:
+            return list(itertools.islice(self._rows, size))
+        try:
+            return self._cur.fetchmany(size)
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def fetchall(self):
+        if self._rows is not None:
+            return list(self._rows)
+        try:
+            return self._cur.fetchall()
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self._fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._cur.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+RowSqliteCursor = row_cursor(SqliteCursor)
+
+
+class SqliteConnection:
+
+    #WAL: readers do not wait for the writer; IMMEDIATE: a write transaction
+    #takes the write lock at BEGIN instead of failing halfway with BUSY
+    def __init__(self, path, timeout=5.0, metrics=None):
+        self.path = path
+        self.metrics = metrics
+        self.raw = sqlite3.connect(path, timeout=timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   isolation_level='IMMEDIATE', check_same_thread=False, cached_statements=256)
+        self.raw.execute("PRAGMA journal_mode = WAL")
+        self.raw.execute("PRAGMA synchronous = NORMAL")
+        self.raw.execute("PRAGMA foreign_keys = ON")
+        # ZooStats.rebuild() runs SELECT zoo_stats_rebuild() like on postgres
+        self.raw.create_function('zoo_stats_rebuild', 0, self._stats_rebuild)
+        self.closed = False
+
+    def _stats_rebuild(self):
+        for statement in STATS_REBUILD:
+            self.raw.execute(statement)
+
+    def cursor(self, name=None):
+        return RowSqliteCursor(self, name)
+
+    def commit(self):
+        try:
+            self.raw.commit()
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def rollback(self):
+        try:
+            self.raw.rollback()
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def close(self):
+        self.raw.close()
+        self.closed = True
+
+
+class SqliteZooApp(zooApp):
+
+    #zooApp on an embedded SQLite file ([sqlite] path=, timeout=): the same
+    #methods, rows and errors, one connection and no server. Pools,
+    #replicas, PREPARE and the COPY based import are postgres only
+    backend = 'sqlite'
+
+    def __init__(self, configfile, section):
+        super().__init__(configfile, section)
+        self.path = 'zoo/zoo.db'
+        self.statements = StatementRegistry(SQLITE_STATEMENTS)
+
+    def connect(self):
+        self._configure()
+        # sqlite keeps compiled statements per connection by itself
+        self.use_prepared = False
+        options = self.config('sqlite') if self.has_section('sqlite') else {}
+        self.path = options.get('path', self.path)
+        try:
+            self.conn = SqliteConnection(self.path, float(options.get('timeout', 5)), self.metrics)
+        except sqlite3.Error as e:
+            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            logging.error(f"{timestamp} - {str(e)}")
+            raise psycopg2.OperationalError(f"cannot open {self.path}: {e}") from e
+        self.cur = self.conn.cursor()
+
+    def __repr__(self):
+        if self.conn is not None:
+            return f"Connected to SQLite database '{self.path}'"
+        return "Not connected to any database"
+
+    def schema_version(self):
+        with self._lock:
+            return self.conn.raw.execute("PRAGMA user_version").fetchone()[0]
+
+    def latest_version(self):
+        return MIGRATIONS[-1][0]
+
+    #each pending migration in its own transaction, a current schema costs
+    #one PRAGMA read
+    def create_tables(self):
+        with self._lock:
+            raw = self.conn.raw
+            current = raw.execute("PRAGMA user_version").fetchone()[0]
+            for version, description, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                script = "".join(f"{statement};\n" for statement in statements)
+                try:
+                    raw.executescript(f"BEGIN IMMEDIATE;\n{script}PRAGMA user_version = {version};\nCOMMIT;")
+                except sqlite3.Error as e:
+                    if raw.in_transaction:
+                        raw.rollback()
+                    logging.error(f"sqlite migration {version} ({description}) failed: {e}")
+                    return
+
+    def trigram_available(self):
+        return False
+
+    # '"kal"* AND "lion"*', the words are letters and digits only
+    def _search_query(self, words):
+        return ' AND '.join(f'"{word}"*' for word in words)
+
+    # animal_overview is a plain view here, never stale
+    def refresh_overview(self, force=False):
+        return False
@@ -0,0 +1,215 @@
+import logging
+import re
+import time
+import psycopg2
+import psycopg2.errors
+
+# every SQL statement of the zooApp DAO, by name (the name of the method
+# that runs it). Names are PREPAREd as zoo_<name> on each connection;
+# server side cursors (stream_*) cannot DECLARE ... FOR EXECUTE and use the
+# plain text. Reads name their columns in the order of the zooRows classes.
+STATEMENTS = {
+    #enclosure
+    "view_all_enclosures": "SELECT enclosure_id, name, size FROM enclosure",
+    "add_enclosure": "INSERT INTO enclosure (name, size) VALUES (%s, %s) RETURNING enclosure_id",
+    "edit_enclosure": "UPDATE enclosure SET name = %s, size = %s WHERE enclosure_id = %s",
+    "delete_enclosure": "DELETE FROM enclosure WHERE enclosure_id = %s",
+    "get_enclosure_by_id": "SELECT enclosure_id, name, size FROM enclosure WHERE enclosure_id = %s",
+    #animalcat
+    "view_all_animalcats": "SELECT animalcat_id, category FROM animalcat",
+    "add_animalcat": "INSERT INTO animalcat (category) VALUES (%s) RETURNING animalcat_id",
+    "edit_animalcat": "UPDATE animalcat SET category = %s WHERE animalcat_id = %s",
+    "delete_animalcat": "DELETE FROM animalcat WHERE animalcat_id = %s",
+    "get_animalcat_by_id": "SELECT animalcat_id, category FROM animalcat WHERE animalcat_id = %s",
+    #animalbreed
+    "view_all_animalbreed": "SELECT animalbreed_id, breed, animalcat_id FROM animalbreed",
+    "add_animalbreed": "INSERT INTO animalbreed (breed, animalcat_id) VALUES (%s, %s) RETURNING animalbreed_id",
+    "edit_animalbreed": "UPDATE animalbreed SET breed = %s, animalcat_id = %s WHERE animalbreed_id = %s",
+    "delete_animalbreed": "DELETE FROM animalbreed WHERE animalbreed_id = %s",
+    "get_animalbreed_by_id": "SELECT animalbreed_id, breed, animalcat_id FROM animalbreed WHERE animalbreed_id = %s",
+    #keeper
+    "view_all_keepers": "SELECT keeper_id, name, enclosure_id FROM keeper",
+    "add_keeper": "INSERT INTO keeper (name, enclosure_id) VALUES (%s, %s) RETURNING keeper_id",
+    "edit_keeper": "UPDATE keeper SET name = %s, enclosure_id = %s WHERE keeper_id = %s",
+    "delete_keeper": "DELETE FROM keeper WHERE keeper_id = %s",
+    "get_keeper_by_id": "SELECT keeper_id, name, enclosure_id FROM keeper WHERE keeper_id = %s",
+    "view_keepers_by_enclosure": "SELECT keeper_id, name, enclosure_id FROM keeper WHERE enclosure_id = %s ORDER BY keeper_id",
+    #animal
+    "view_all_animals": "SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal",
+    "add_animal": "INSERT INTO animal (name, birthday, animalbreed_id, enclosure_id) VALUES (%s, %s, %s, %s) RETURNING animal_id",
+    "edit_animal": "UPDATE animal SET name = %s, birthday = %s, animalbreed_id = %s, enclosure_id = %s WHERE animal_id = %s",
+    "delete_animal": "DELETE FROM animal WHERE animal_id = %s",
+    "get_animal_by_id": "SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal WHERE animal_id = %s",
+    #overview, search, filter
+    "view_animal_overview": "SELECT animal_id, animal, birthday, breed, category, enclosure, keepers FROM animal_overview ORDER BY animal_id",
+    "filter_breeds_by_category": """
+        SELECT animalbreed.breed
+        FROM animalbreed
+        JOIN animalcat ON animalbreed.animalcat_id = animalcat.animalcat_id
+        WHERE animalcat.category = %s
+    """,
+    "filter_breeds_by_categories": """
+        SELECT animalbreed.animalbreed_id, animalbreed.breed, animalcat.category
+        FROM animalbreed
+        JOIN animalcat ON animalbreed.animalcat_id = animalcat.animalcat_id
+        WHERE animalcat.category = ANY(%s)
+        ORDER BY animalcat.category, animalbreed.breed, animalbreed.animalbreed_id
+    """,
+    "search_animal_name": """
+        SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal
+        WHERE name ILIKE %s
+        ORDER BY similarity(name, %s) DESC, animal_id
+        LIMIT %s OFFSET %s
+    """,
+    "search_animal_name_plain": "SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal WHERE name ILIKE %s ORDER BY animal_id LIMIT %s OFFSET %s",
+    #set based changes: one statement for every row of an enclosure, breed
+    #or category (FK indexes of migration 2); the _ids variants RETURN the
+    #ids that changed, for the cache to evict
+    "move_animals": "UPDATE animal SET enclosure_id = %s WHERE enclosure_id = %s",
+    "move_animals_ids": "UPDATE animal SET enclosure_id = %s WHERE enclosure_id = %s RETURNING animal_id",
+    "reassign_keepers": "UPDATE keeper SET enclosure_id = %s WHERE enclosure_id = %s",
+    "reassign_keepers_ids": "UPDATE keeper SET enclosure_id = %s WHERE enclosure_id = %s RETURNING keeper_id",
+    "delete_animals_by_breed": "DELETE FROM animal WHERE animalbreed_id = %s",
+    "delete_animals_by_breed_ids": "DELETE FROM animal WHERE animalbreed_id = %s RETURNING animal_id",
+    "retag_breeds": "UPDATE animalbreed SET animalcat_id = %s WHERE animalcat_id = %s",
+    "retag_breeds_ids": "UPDATE animalbreed SET animalcat_id = %s WHERE animalcat_id = %s RETURNING animalbreed_id",
+    #one search over every name (search_index of migration 7); the query is
+    #to_tsquery syntax, kinds the tables to look in
+    "search": """
+        SELECT kind, id, label, ts_rank(document, query) AS rank
+        FROM search_index, to_tsquery('simple', %s) query
+        WHERE document @@ query AND kind = ANY(%s)
+        ORDER BY rank DESC, length(label), kind, id
+        LIMIT %s OFFSET %s
+    """,
+    #statistics, read from the trigger maintained summary tables
+    "stats_enclosures": """
+        SELECT enclosure.enclosure_id, enclosure.name, enclosure.size, enclosure_stats.animals, enclosure_stats.keepers,
+               round(enclosure_stats.animals::numeric / NULLIF(enclosure.size, 0), 4) AS density
+        FROM enclosure_stats
+        JOIN enclosure ON enclosure.enclosure_id = enclosure_stats.enclosure_id
+        ORDER BY enclosure.enclosure_id
+    """,
+    "stats_categories": """
+        SELECT animalcat.animalcat_id, animalcat.category, category_stats.breeds, category_stats.animals
+        FROM category_stats
+        JOIN animalcat ON animalcat.animalcat_id = category_stats.animalcat_id
+        ORDER BY category_stats.animals DESC, animalcat.animalcat_id
+    """,
+    "stats_totals": """
+        SELECT count(*), coalesce(sum(enclosure_stats.animals), 0), coalesce(sum(enclosure_stats.keepers), 0),
+               coalesce(sum(enclosure.size), 0)
+        FROM enclosure_stats
+        JOIN enclosure ON enclosure.enclosure_id = enclosure_stats.enclosure_id
+    """,
+    #keyset pages: rows after / before an id in id order, LIMIT is page size + 1
+    "page_enclosures": "SELECT enclosure_id, name, size FROM enclosure WHERE enclosure_id > %s ORDER BY enclosure_id LIMIT %s",
+    "page_enclosures_before": "SELECT enclosure_id, name, size FROM enclosure WHERE enclosure_id < %s ORDER BY enclosure_id DESC LIMIT %s",
+    "page_animalcats": "SELECT animalcat_id, category FROM animalcat WHERE animalcat_id > %s ORDER BY animalcat_id LIMIT %s",
+    "page_animalcats_before": "SELECT animalcat_id, category FROM animalcat WHERE animalcat_id < %s ORDER BY animalcat_id DESC LIMIT %s",
+    "page_animalbreed": "SELECT animalbreed_id, breed, animalcat_id FROM animalbreed WHERE animalbreed_id > %s ORDER BY animalbreed_id LIMIT %s",
+    "page_animalbreed_before": "SELECT animalbreed_id, breed, animalcat_id FROM animalbreed WHERE animalbreed_id < %s ORDER BY animalbreed_id DESC LIMIT %s",
+    "page_keepers": "SELECT keeper_id, name, enclosure_id FROM keeper WHERE keeper_id > %s ORDER BY keeper_id LIMIT %s",
+    "page_keepers_before": "SELECT keeper_id, name, enclosure_id FROM keeper WHERE keeper_id < %s ORDER BY keeper_id DESC LIMIT %s",
+    "page_animals": "SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal WHERE animal_id > %s ORDER BY animal_id LIMIT %s",
+    "page_animals_before": "SELECT animal_id, name, birthday, animalbreed_id, enclosure_id FROM animal WHERE animal_id < %s ORDER BY animal_id DESC LIMIT %s",
+    "page_animal_overview": "SELECT animal_id, animal, birthday, breed, category, enclosure, keepers FROM animal_overview WHERE animal_id > %s ORDER BY animal_id LIMIT %s",
+    "page_animal_overview_before": "SELECT animal_id, animal, birthday, breed, category, enclosure, keepers FROM animal_overview WHERE animal_id < %s ORDER BY animal_id DESC LIMIT %s",
+}
+
+# hot lookups for the prepared vs ad-hoc benchmark: (statement, table, id column)
+HOT_LOOKUPS = [
+    ("get_enclosure_by_id", "enclosure", "enclosure_id"),
+    ("get_animalcat_by_id", "animalcat", "animalcat_id"),
+    ("get_animalbreed_by_id", "animalbreed", "animalbreed_id"),
+    ("get_keeper_by_id", "keeper", "keeper_id"),
+    ("get_animal_by_id", "animal", "animal_id"),
+]
+
+
+def _numbered(sql):
+    counter = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda m: f"${next(counter)}", sql)
+
+
+class StatementRegistry:
+
+    def __init__(self, statements=None):
+        self.statements = dict(STATEMENTS if statements is None else statements)
+        # what a read only replica connection prepares
+        self.reads = [name for name, sql in self.statements.items() if sql.lstrip().upper().startswith("SELECT")]
+        self._execute = {}
+        for name, sql in self.statements.items():
+            count = sql.count("%s")
+            args = " (" + ", ".join(["%s"] * count) + ")" if count else ""
+            self._execute[name] = f"EXECUTE zoo_{name}{args}"
+
+    def sql(self, name):
+        return self.statements[name]
+
+    def execute_sql(self, name):
+        return self._execute[name]
+
+    #the statement with $1, $2, ... placeholders, as PREPARE wants it
+    def numbered(self, name):
+        return _numbered(self.statements[name])
+
+    #PREPARE everything (or names) on an idle connection, returns the names
+    #that worked (one round trip; on error each statement is tried on its own)
+    def prepare(self, conn, names=None):
+        names = list(self.statements if names is None else names)
+        prepares = [f"PREPARE zoo_{name} AS {self.numbered(name)}" for name in names]
+        cur = conn.cursor()
+        try:
+            cur.execute("DEALLOCATE ALL; " + "; ".join(prepares))
+            conn.commit()
+            return set(names)
+        except psycopg2.errors.UndefinedTable:
+            # schema not migrated yet, zooApp prepares again afterwards
+            conn.rollback()
+            cur.close()
+            return set()
+        except psycopg2.Error as e:
+            logging.error(f"preparing statements failed, retrying one by one: {e}")
+            conn.rollback()
+        # PREPARE is not undone by the rollback, the statements before the
+        # failing one would all be "already exists" now
+        cur.execute("DEALLOCATE ALL")
+        conn.commit()
+        prepared = set()
+        for name, prepare in zip(names, prepares):
+            try:
+                cur.execute(prepare)
+                conn.commit()
+                prepared.add(name)
+            except psycopg2.Error as e:
+                # e.g. similarity() without pg_trgm, runs ad-hoc instead
+                logging.error(f"statement {name} not prepared: {e}")
+                conn.rollback()
+        cur.close()
+        return prepared
+
+
+#ops/s of the hot get_*_by_id lookups, prepared vs ad-hoc, on one connection
+def benchmark(dao, iterations=1000):
+    results = []
+    with dao.cursor() as cur:
+        prepared = dao.prepared_statements(cur.connection)
+        for name, table, column in HOT_LOOKUPS:
+            cur.execute(f"SELECT min({column}) FROM {table}")
+            key = cur.fetchone()[0]
+            if key is None:
+                continue
+            timings = {}
+            modes = [("ad-hoc", dao.statements.sql(name))]
+            if name in prepared:
+                modes.append(("prepared", dao.statements.execute_sql(name)))
+            for mode, sql in modes:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    cur.execute(sql, (key,))
+                    cur.fetchone()
+                timings[mode] = iterations / (time.perf_counter() - start)
+            results.append((name, timings.get("ad-hoc"), timings.get("prepared")))
+        dao.commit(cur)
+    return results
@@ -0,0 +1,91 @@
+import logging
+import psycopg2
+
+# the same numbers computed from the base tables, to check the summary
+# tables against (costs a full GROUP BY, the screen never runs it)
+LIVE_ENCLOSURES = """
+    SELECT enclosure.enclosure_id,
+           (SELECT count(*) FROM animal WHERE animal.enclosure_id = enclosure.enclosure_id),
+           (SELECT count(*) FROM keeper WHERE keeper.enclosure_id = enclosure.enclosure_id)
+    FROM enclosure
+    ORDER BY enclosure.enclosure_id
+"""
+
+LIVE_CATEGORIES = """
+    SELECT animalcat.animalcat_id, count(DISTINCT animalbreed.animalbreed_id), count(animal.animal_id)
+    FROM animalcat
+    LEFT JOIN animalbreed ON animalbreed.animalcat_id = animalcat.animalcat_id
+    LEFT JOIN animal ON animal.animalbreed_id = animalbreed.animalbreed_id
+    GROUP BY animalcat.animalcat_id
+    ORDER BY animalcat.animalcat_id
+"""
+
+
+class ZooStats:
+
+    #animals/keepers per enclosure, density per m2, breeds/animals per
+    #category; enclosure_stats and category_stats are kept current by
+    #triggers (migration 5), so every read is a join on two primary keys
+    def __init__(self, dao):
+        self.dao = dao
+
+    def _fetch(self, name, what):
+        try:
+            with self.dao.read_cursor() as cur:
+                self.dao.execute(cur, name)
+                return cur.fetchall()
+        except psycopg2.Error as e:
+            logging.error(e)
+            print(f"Error occurred while retrieving {what}.")
+            return []
+
+    #(enclosure id, name, size, animals, keepers, animals per m2)
+    def enclosures(self):
+        return self._fetch("stats_enclosures", "enclosure statistics")
+
+    #(category id, category, breeds, animals), most animals first
+    def categories(self):
+        return self._fetch("stats_categories", "category statistics")
+
+    def totals(self):
+        rows = self._fetch("stats_totals", "zoo totals")
+        if not rows:
+            return {}
+        enclosures, animals, keepers, size = rows[0]
+        return {
+            'enclosures': enclosures,
+            'animals': animals,
+            'keepers': keepers,
+            'size': size,
+            'density': round(animals / size, 4) if size else None,
+        }
+
+    #recount everything, e.g. after a restore with triggers disabled
+    def rebuild(self):
+        try:
+            with self.dao.cursor() as cur:
+                cur.execute("SELECT zoo_stats_rebuild()")
+                self.dao.commit(cur)
+            return True
+        except psycopg2.Error as e:
+            logging.error(e)
+            print("Error occurred while rebuilding the statistics.")
+            return False
+
+    #rows where the summary tables and a live GROUP BY disagree:
+    #(table, id, stored, live)
+    def check(self):
+        with self.dao.cursor() as cur:
+            cur.execute("SELECT enclosure_id, animals, keepers FROM enclosure_stats ORDER BY enclosure_id")
+            stored = {row[0]: row[1:] for row in cur.fetchall()}
+            cur.execute(LIVE_ENCLOSURES)
+            live = {row[0]: row[1:] for row in cur.fetchall()}
+            mismatches = [('enclosure_stats', key, stored.get(key), live.get(key))
+                          for key in sorted(set(stored) | set(live)) if stored.get(key) != live.get(key)]
+            cur.execute("SELECT animalcat_id, breeds, animals FROM category_stats ORDER BY animalcat_id")
+            stored = {row[0]: row[1:] for row in cur.fetchall()}
+            cur.execute(LIVE_CATEGORIES)
+            live = {row[0]: row[1:] for row in cur.fetchall()}
+            mismatches += [('category_stats', key, stored.get(key), live.get(key))
+                           for key in sorted(set(stored) | set(live)) if stored.get(key) != live.get(key)]
+        return mismatches